@@ -0,0 +1,324 @@
+"""
+真！飛行機無双（koukatongari.py）のベンチマーク
+決まった重い状態（シナリオ）でゲームを画面なしで回し，ticks/秒と1フレームの処理時間（p50/p99）を測る
+あわせて主な関数・処理単体の時間（マイクロベンチマーク）も測り，結果をJSONで保存・基準値と比較する
+
+    python bench.py --out result.json
+    python bench.py --baseline baseline.json --threshold 0.15   # 基準より15%以上遅ければ終了コード1
+
+起動時間（import・最初のフレームまでのミリ秒）は別プロセスで毎回新しく起動して測る
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame as pg
+
+import koukatongari as kt
+
+
+ALL_WEAPONS = {"weapon_mode": 1, "satellite": 2, "slash": 1, "boomerang": 1, "homing": 1}  # 全武器を強化した状態
+BOSS_HP = 10**6  # ベンチマーク中にボスを倒してしまわないHP
+STRESS_BULLETS = 10000
+CROWD = {"emys": 40, "bombs": 200, "weapons": 60}  # 当たり判定のマイクロベンチマークで画面に並べる数
+
+
+def keep_alive(game: kt.Game):
+    """
+    飛行機が倒れたりラウンドが進んだりしないようにして，シナリオの状態を保つ
+    """
+    game.bird.hp = 10**9
+    game.score.value = min(game.score.value, game.round_manager.required_scores[-1] - 1)
+
+
+def setup_none(game: kt.Game):
+    """
+    何も準備しない（開始ラウンドの状態のまま計測する）
+    """
+
+
+def setup_all_weapons(game: kt.Game):
+    game.weapon_dict.update(ALL_WEAPONS)
+    game.weapon_cooldown["bullet"] = 7  # rate_upを取った状態
+
+
+def setup_boss(game: kt.Game):
+    game.weapon_dict.update(ALL_WEAPONS)
+
+
+def tick_boss(game: kt.Game):
+    for boss in game.bosses:
+        if boss.boss_mode != "tuyotuyotuyo":
+            boss.hp = BOSS_HP // 5  # 次のupdateで最終段階（2フレームごとに爆弾を投下）になる
+
+
+def setup_stress(game: kt.Game):
+    """
+    最初からBulletEngineにSTRESS_BULLETS発の弾を入れておく（計測前の準備フレームから満杯にする）
+    """
+    tick_stress(game)
+
+
+def tick_stress(game: kt.Game):
+    """
+    スプライトに対応しない弾をBulletEngineにSTRESS_BULLETS発まで補充する
+    """
+    engine = game.bullet_engine
+    image = kt.Bomb.circle(10, (255, 0, 0))
+    rect = image.get_rect()
+    for _ in range(STRESS_BULLETS - len(engine)):
+        rect.center = game.rng.randint(0, kt.WIDTH), game.rng.randint(0, kt.HEIGHT)
+        vx, vy = game.rng.choice([(0, 1), (1, 1), (1, 0), (-1, 0), (-1, 1), (0, -1)])
+        engine.spawn(rect, vx, vy, 2, 1, image)
+
+
+# シナリオ名: (開始ラウンド，Gameの追加引数，開始時の準備，毎フレームの処理)
+SCENARIOS = {
+    "round3": (3, {}, setup_none, None),  # 80フレームごとに敵機5体
+    "all_weapons": (3, {}, setup_all_weapons, None),
+    "boss_tuyotuyotuyo": (4, {"bosshp": BOSS_HP}, setup_boss, tick_boss),
+    "stress_10k_bullets": (0, {"bullet_engine": True}, setup_stress, tick_stress),
+}
+
+
+def run_scenario(screen: pg.Surface, name: str, ticks: int, warmup: int, seed: int) -> dict:
+    """
+    シナリオを1つ実行し，ticks/秒とフレーム時間のパーセンタイルを返す
+    引数1 screen：画面Surface
+    引数2 name：シナリオ名
+    引数3 ticks：計測するフレーム数
+    引数4 warmup：計測前に進めるフレーム数（ラウンド開始の演出を飛ばし，敵を揃える）
+    引数5 seed：乱数のシード
+    """
+    start_round, options, setup, every_tick = SCENARIOS[name]
+    game = kt.Game(screen, start_round, seed=seed, profiler=kt.FrameProfiler(True, ticks), **options)
+    setup(game)
+    pilot = kt.RandomInput(seed)
+    times = []
+    for i in range(warmup + ticks):
+        keep_alive(game)
+        if every_tick is not None:
+            every_tick(game)
+        t0 = time.perf_counter()
+        game.step(pilot.get_pressed(game.tmr), [])
+        if i >= warmup:
+            times.append(time.perf_counter() - t0)
+    times.sort()
+    return {
+        "ticks": ticks,
+        "ticks_per_sec": ticks / sum(times),
+        "p50_ms": times[len(times) // 2] * 1000,
+        "p99_ms": times[min(len(times) - 1, len(times) * 99 // 100)] * 1000,
+        "sprites": game.sprite_counts(),
+        "phases_ms": game.profiler.summary(),  # 処理ごとの1フレームあたりの平均時間（衝突処理・各グループのupdateなど）
+    }
+
+
+def heavy_game(screen: pg.Surface, seed: int) -> kt.Game:
+    """
+    マイクロベンチマーク用に全武器・ラウンド3で敵と弾が揃った状態のゲームを作る
+    """
+    game = kt.Game(screen, 3, seed=seed)
+    setup_all_weapons(game)
+    pilot = kt.RandomInput(seed)
+    for _ in range(300):
+        keep_alive(game)
+        game.update(pilot.get_pressed(game.tmr), [])
+    keep_alive(game)
+    return game
+
+
+def crowded_game(screen: pg.Surface, seed: int) -> kt.Game:
+    """
+    heavy_gameに敵機・爆弾・通常弾をCROWDの数だけ画面内のランダムな位置に足したゲームを作る
+    （ラウンド3の敵と弾が最も多い場面より多めで，ブロードフェーズの効果を測る）
+    """
+    game = heavy_game(screen, seed)
+    rng = random.Random(seed)
+
+    def scatter(sprite: pg.sprite.Sprite) -> pg.sprite.Sprite:
+        sprite.rect.center = rng.randrange(kt.WIDTH), rng.randrange(kt.HEIGHT)
+        return sprite
+    emy = kt.Enemy()
+    game.emys.add(scatter(kt.Enemy()) for _ in range(CROWD["emys"]))
+    game.bombs.add(scatter(kt.Bomb.spawn(emy, game.bird)) for _ in range(CROWD["bombs"]))
+    game.weapons.add(scatter(kt.NormalWeapon.spawn(game.bird)) for _ in range(CROWD["weapons"]))
+    return game
+
+
+def micro_collide(game: kt.Game, suffix: str = "") -> dict:
+    """
+    gameの全武器と全対象の当たり判定を，SpatialHash（見た目どおり・矩形だけ）とpygameの総当たりで測る
+    """
+    targets = (game.emys, game.bombs, game.bosses, game.bombs2)
+    weapons = game.weapons.sprites() + kt.ShootingSatelliteWeapon.bullets.sprites()
+
+    def broadphase():
+        game.hit.build(*targets)
+        for weapon in weapons:
+            for group in targets:
+                game.hit.spritecollide(weapon, group, False)
+
+    def bruteforce(collided=kt.masks.collide):
+        for weapon in weapons:
+            for group in targets:
+                pg.sprite.spritecollide(weapon, group, False, collided)
+    results = {}
+    results[f"collide:spatial_hash{suffix}"] = micro(broadphase, number=100)
+    kt.SpatialHash.precise = False
+    results[f"collide:spatial_hash_rect{suffix}"] = micro(broadphase, number=100)  # 見た目どおりの判定をしない場合
+    kt.SpatialHash.precise = True
+    results[f"collide:pygame{suffix}"] = micro(bruteforce, number=100)
+    results[f"collide:pygame_rect{suffix}"] = micro(lambda: bruteforce(None), number=100)
+    return results
+
+
+def micro(stmt, setup=None, number: int = 1000, repeat: int = 7) -> dict:
+    """
+    stmtをnumber回呼ぶ時間をrepeat回測り，1回あたりの時間（マイクロ秒）の中央値と最小値を返す
+    setupを指定すると測る前に毎回呼ぶ（状態が変わる処理用）
+    """
+    runs = timeit.repeat(stmt, setup or (lambda: None), number=number, repeat=repeat)
+    return {"us_per_call": statistics.median(runs) / number * 1e6, "us_min": min(runs) / number * 1e6}
+
+
+def run_micro(screen: pg.Surface, seed: int) -> dict:
+    """
+    主な関数・処理単体の時間を測る
+    当たり判定は敵と弾が揃った状態で，スプライトを消さずに判定だけを繰り返す
+    """
+    results = {}
+    rect = pg.Rect(100, 200, 30, 30)
+    dst = pg.Rect(300, 600, 50, 50)
+    results["check_bound"] = micro(lambda: kt.check_bound(rect), number=100000)
+    results["calc_orientation"] = micro(lambda: kt.calc_orientation(rect, dst), number=100000)
+
+    game = heavy_game(screen, seed)
+    results.update(micro_collide(game))
+    results.update(micro_collide(crowded_game(screen, seed), "(crowded)"))
+    results["bird_hit"] = micro(lambda: game.hit.spritecollide(game.bird, game.bombs, False), number=1000)
+
+    emys = pg.sprite.Group(kt.Enemy() for _ in range(50))
+    results["update:enemy(50)"] = micro(emys.update, number=100)
+    bombs = pg.sprite.Group()
+    emy = kt.Enemy()
+
+    def fresh_bombs():
+        bombs.empty()
+        bombs.add(kt.Bomb(emy, game.bird) for _ in range(500))
+    results["update:bomb(500)"] = micro(bombs.update, fresh_bombs, number=1, repeat=50)
+    results["update:bird"] = micro(lambda: game.bird.update(kt.KeyState([pg.K_LEFT])), number=1000)
+    return results
+
+
+def run_startup(runs: int = 5) -> dict:
+    """
+    koukatongari.pyを画面なしで1フレームだけ実行するプロセスをruns回起動し，起動時間（ミリ秒）の中央値を返す
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "koukatongari.py")
+    env = dict(os.environ, SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy")
+    marks = {}
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, script, "--headless", "--ticks", "1", "--startup"],
+                             capture_output=True, text=True, env=env, check=True).stdout
+        line = next(line for line in out.splitlines() if line.startswith("startup: "))
+        for name, ms in json.loads(line[len("startup: "):]).items():
+            marks.setdefault(name, []).append(ms)
+    return {name: statistics.median(values) for name, values in marks.items()}
+
+
+def compare(result: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    基準と比べてthresholdの割合を超えて遅くなった項目を返す
+    シナリオはticks/秒，マイクロベンチマークは1回あたりの時間，起動は各時刻までのミリ秒で比べる
+    """
+    regressions = []
+    for name, base in baseline.get("scenarios", {}).items():
+        now = result["scenarios"].get(name)
+        if now is not None and now["ticks_per_sec"] < base["ticks_per_sec"] * (1 - threshold):
+            regressions.append(f"{name}: {base['ticks_per_sec']:.0f} -> {now['ticks_per_sec']:.0f} ticks/s")
+    for name, base in baseline.get("micro", {}).items():
+        now = result["micro"].get(name)
+        if now is not None and "us_per_call" in base and now["us_per_call"] > base["us_per_call"] * (1 + threshold):
+            regressions.append(f"{name}: {base['us_per_call']:.2f} -> {now['us_per_call']:.2f} us/call")
+    for name, base in baseline.get("startup", {}).items():
+        now = result.get("startup", {}).get(name)
+        if now is not None and now > base * (1 + threshold):
+            regressions.append(f"startup:{name}: {base:.0f} -> {now:.0f} ms")
+    return regressions
+
+
+def parse_args(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="koukatongari.pyのベンチマーク")
+    parser.add_argument("--ticks", type=int, default=1000, help="シナリオごとに計測するフレーム数")
+    parser.add_argument("--warmup", type=int, default=200, help="計測前に進めるフレーム数")
+    parser.add_argument("--seed", type=int, default=1, help="乱数のシード")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="実行するシナリオ（複数指定可，省略時はすべて）")
+    parser.add_argument("--no-micro", action="store_true", help="マイクロベンチマークを行わない")
+    parser.add_argument("--no-startup", action="store_true", help="起動時間を測らない")
+    parser.add_argument("--out", default=None, help="結果を保存するJSONのパス")
+    parser.add_argument("--baseline", default=None, help="比較する基準の結果（--outで保存したJSON）")
+    parser.add_argument("--threshold", type=float, default=0.1, help="遅くなったとみなす割合（0.1で10%%）")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    pg.init()
+    screen = pg.display.set_mode((kt.WIDTH, kt.HEIGHT))
+    kt.assets.convert_all()
+    names = args.scenario or list(SCENARIOS)
+    if kt.np is None and "stress_10k_bullets" in names:
+        print("stress_10k_bullets: NumPyがないので省略")
+        names.remove("stress_10k_bullets")
+
+    result = {
+        "python": platform.python_version(),
+        "pygame": pg.version.ver,
+        "numpy": None if kt.np is None else kt.np.__version__,
+        "scenarios": {},
+        "micro": {},
+        "startup": {},
+    }
+    for name in names:
+        stats = run_scenario(screen, name, args.ticks, args.warmup, args.seed)
+        result["scenarios"][name] = stats
+        print(f"{name:>26}: {stats['ticks_per_sec']:8.0f} ticks/s  p50 {stats['p50_ms']:6.2f} ms  p99 {stats['p99_ms']:6.2f} ms")
+    if not args.no_micro:
+        result["micro"] = run_micro(screen, args.seed)
+        for name, stats in result["micro"].items():
+            if "us_per_call" in stats:
+                print(f"{name:>26}: {stats['us_per_call']:10.2f} us/call")
+    if not args.no_startup:
+        result["startup"] = run_startup()
+        for name, ms in result["startup"].items():
+            print(f"{'startup:' + name:>26}: {ms:10.1f} ms")
+
+    if args.out is not None:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    if args.baseline is not None:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print(f"基準（{args.baseline}）から{args.threshold:.0%}を超える低下なし")
+    pg.quit()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
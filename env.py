@@ -0,0 +1,265 @@
+"""
+真！飛行機無双（koukatongari.py）を強化学習のエージェントから操作するための環境
+Gym風のreset(seed)/step(action)で1フレームずつ進め，観測をNumPy配列で返す
+
+    env = GameEnv(obs="features")
+    obs = env.reset(seed=0)
+    obs, reward, done, info = env.step(action)
+
+VectorEnvは複数のGameEnvを別プロセスで動かし，観測を共有メモリに直接書かせるので，
+まとめて進めても画像をpickleで送り合わずに済む
+"""
+import multiprocessing as mp
+import os
+from multiprocessing import shared_memory
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import numpy as np
+import pygame as pg
+
+import koukatongari as kt
+
+
+# 行動番号 → (移動方向, 高速移動するか)．0～8が通常速度，9～17がLSHIFTを押した高速移動
+DIRECTIONS = [(0, 0), (0, -1), (+1, -1), (+1, 0), (+1, +1), (0, +1), (-1, +1), (-1, 0), (-1, -1)]
+ACTIONS = [(d, shift) for shift in (False, True) for d in DIRECTIONS]
+DIRECTION_KEYS = {(0, -1): [pg.K_UP], (0, +1): [pg.K_DOWN], (-1, 0): [pg.K_LEFT], (+1, 0): [pg.K_RIGHT]}
+
+# 特徴量ベクトルに入れるスプライトの数（飛行機に近い順，足りない分は0で埋める）
+MAX_ENEMIES = 16
+MAX_BOMBS = 32
+MAX_ITEMS = 2
+HP_PENALTY = 10  # HPが1減ったときの報酬の減少（スコア10点分）
+
+
+def action_keys(action: int) -> kt.KeyState:
+    """
+    行動番号を押下キーに変換する
+    """
+    (dx, dy), shift = ACTIONS[action]
+    keys = DIRECTION_KEYS.get((dx, 0), []) + DIRECTION_KEYS.get((0, dy), [])
+    if shift:
+        keys.append(pg.K_LSHIFT)
+    return kt.KeyState(keys)
+
+
+def observation_spec(obs: str, frame_size: tuple[int, int]) -> tuple[tuple[int, ...], type]:
+    """
+    観測の種類に応じた配列の形とdtypeを返す
+    """
+    if obs == "frame":
+        return (frame_size[1], frame_size[0], 3), np.uint8
+    if obs == "features":
+        return (4 + 3 + 2 * MAX_ENEMIES + 4 * MAX_BOMBS + 2 * MAX_ITEMS,), np.float32
+    raise ValueError(f"obs must be 'features' or 'frame': {obs!r}")
+
+
+class GameEnv:
+    """
+    1つのゲームを1フレームずつ進める環境に関するクラス
+    ゲームの状態の一部（gameroundやShootingSatelliteWeapon.bullets）はモジュール全体で共有なので，
+    1つのプロセスで同時に動かせるGameEnvは1つだけ（複数動かすときはVectorEnvを使う）
+    """
+    def __init__(self, obs: str = "features", start_round: int = 0, bosshp: int = 100,
+                 frame_size: tuple[int, int] = (60, 90), frame_skip: int = 1, max_ticks: int = 30000):
+        """
+        引数1 obs："features"（スプライトの位置などの特徴量ベクトル）か"frame"（縮小した画面のRGB画像）
+        引数2 start_round：開始ラウンド
+        引数3 bosshp：ボスのHP
+        引数4 frame_size：obs="frame"のときの画像の大きさ（幅, 高さ）
+        引数5 frame_skip：1回のstepで同じ行動を続けるフレーム数
+        引数6 max_ticks：このフレーム数で打ち切る
+        """
+        self.observation_shape, self.observation_dtype = observation_spec(obs, frame_size)
+        self.obs_type = obs
+        self.start_round = start_round
+        self.bosshp = bosshp
+        self.frame_size = tuple(frame_size)
+        self.frame_skip = frame_skip
+        self.max_ticks = max_ticks
+        self.action_count = len(ACTIONS)
+        if not pg.get_init():
+            pg.init()
+        self.screen = pg.display.get_surface() or pg.display.set_mode((kt.WIDTH, kt.HEIGHT))
+        kt.assets.convert_all()
+        self.game = None
+
+    def reset(self, seed: int | None = None, out: np.ndarray | None = None) -> np.ndarray:
+        """
+        新しいゲームを始めて最初の観測を返す
+        引数1 seed：ゲームの乱数のシード
+        引数2 out：観測を書き込む配列（省略時は新しく確保する）
+        """
+        self.game = kt.Game(self.screen, self.start_round, self.bosshp, seed=seed)
+        return self.observe(out)
+
+    def step(self, action: int, out: np.ndarray | None = None) -> tuple[np.ndarray, float, bool, dict]:
+        """
+        行動actionでframe_skipフレーム進める
+        引数1 action：行動番号（0～len(ACTIONS)-1）
+        引数2 out：観測を書き込む配列（省略時は新しく確保する）
+        戻り値：(観測, 報酬, 終了したか, 情報)．報酬はスコアの増分からHPの減少×HP_PENALTYを引いたもの
+        """
+        game = self.game
+        keys = action_keys(action)
+        score, hp = game.score.value, game.bird.hp
+        result = None
+        for _ in range(self.frame_skip):
+            result = game.update(keys, [])
+            if result is not None:
+                break
+        reward = (game.score.value - score) - HP_PENALTY * max(hp - game.bird.hp, 0)
+        done = result is not None or game.tmr >= self.max_ticks
+        info = {"tick": game.tmr, "score": game.score.value, "hp": game.bird.hp,
+                "round": game.round_manager.current_round, "result": result}
+        return self.observe(out), float(reward), done, info
+
+    def observe(self, out: np.ndarray | None = None) -> np.ndarray:
+        """
+        現在の状態の観測を返す
+        """
+        if out is None:
+            out = np.zeros(self.observation_shape, self.observation_dtype)
+        if self.obs_type == "frame":
+            self.game.draw()
+            small = pg.transform.smoothscale(self.screen, self.frame_size)
+            out[...] = pg.surfarray.pixels3d(small).swapaxes(0, 1)
+        else:
+            self.features(out)
+        return out
+
+    def features(self, out: np.ndarray):
+        """
+        特徴量ベクトルをoutに書き込む（座標は画面の大きさで割って0～1にする）
+        [飛行機x, y, HP, 無敵か, ボスx, y, HP割合, 敵機(x, y)×MAX_ENEMIES, 爆弾(x, y, vx, vy)×MAX_BOMBS, アイテム(x, y)×MAX_ITEMS]
+        敵機・爆弾は飛行機に近い順に並べる
+        """
+        game = self.game
+        bird = game.bird
+        bx, by = bird.rect.center
+        out[:] = 0
+        out[0:4] = bx / kt.WIDTH, by / kt.HEIGHT, bird.hp / 5, bird.is_invincible
+        for boss in game.bosses:
+            out[4:7] = boss.rect.centerx / kt.WIDTH, boss.rect.centery / kt.HEIGHT, boss.hp / game.bosshp
+        pos = 7
+
+        def nearest(sprites, n):
+            return sorted(sprites, key=lambda s: (s.rect.centerx - bx) ** 2 + (s.rect.centery - by) ** 2)[:n]
+        for i, emy in enumerate(nearest(game.emys, MAX_ENEMIES)):
+            out[pos + 2 * i:pos + 2 * i + 2] = emy.rect.centerx / kt.WIDTH, emy.rect.centery / kt.HEIGHT
+        pos += 2 * MAX_ENEMIES
+        for i, bomb in enumerate(nearest(list(game.bombs) + list(game.bombs2), MAX_BOMBS)):
+            out[pos + 4 * i:pos + 4 * i + 4] = (bomb.rect.centerx / kt.WIDTH, bomb.rect.centery / kt.HEIGHT,
+                                                bomb.vx * bomb.speed / kt.WIDTH, bomb.vy * bomb.speed / kt.HEIGHT)
+        pos += 4 * MAX_BOMBS
+        for i, item in enumerate(list(game.items)[:MAX_ITEMS]):
+            out[pos + 2 * i:pos + 2 * i + 2] = item.rect.centerx / kt.WIDTH, item.rect.centery / kt.HEIGHT
+
+
+def worker(conn, shm_name: str, index: int, n: int, env_options: dict):
+    """
+    VectorEnvのワーカープロセス
+    親から("reset", seed)，("step", action)，("close", None)を受け取り，観測は共有メモリのindex番に書き込む
+    自動で始める次のゲームのシードはseed+n，seed+2n，…（他のワーカーと重ならない）
+    """
+    env = GameEnv(**env_options)
+    next_seed = None
+    shm = shared_memory.SharedMemory(name=shm_name)
+    obs = np.ndarray((n, *env.observation_shape), env.observation_dtype, buffer=shm.buf)[index]
+    try:
+        while True:
+            command, arg = conn.recv()
+            if command == "reset":
+                env.reset(arg, obs)
+                next_seed = None if arg is None else arg + n
+                conn.send(None)
+            elif command == "step":
+                _, reward, done, info = env.step(arg, obs)
+                if done:  # 終わったゲームはすぐに次のゲームを始める
+                    info["final_tick"] = info["tick"]
+                    env.reset(next_seed, obs)
+                    if next_seed is not None:
+                        next_seed += n
+                conn.send((reward, done, info))
+            else:
+                break
+    finally:
+        del obs
+        shm.close()
+        conn.close()
+
+
+class VectorEnv:
+    """
+    n個のGameEnvを別々のプロセスでまとめて進める環境に関するクラス
+    観測は共有メモリ上の(n, *observation_shape)の配列で，各ワーカーがそこに直接書き込む
+    終わったゲームはstep()の中で自動的に次のゲームを始める（doneがTrueの要素の観測は新しいゲームのもの）
+    """
+    def __init__(self, n: int, **env_options):
+        """
+        引数1 n：同時に動かす環境の数
+        引数2 env_options：GameEnvに渡す引数
+        """
+        self.n = n
+        self.action_count = len(ACTIONS)
+        self.observation_shape, self.observation_dtype = observation_spec(
+            env_options.get("obs", "features"), env_options.get("frame_size", (60, 90)))
+        size = n * int(np.prod(self.observation_shape)) * np.dtype(self.observation_dtype).itemsize
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.obs = np.ndarray((n, *self.observation_shape), self.observation_dtype, buffer=self.shm.buf)
+        ctx = mp.get_context("spawn")  # 親のpygameの状態を引き継がない
+        self.conns = []
+        self.procs = []
+        for i in range(n):
+            parent, child = ctx.Pipe()
+            proc = ctx.Process(target=worker, args=(child, self.shm.name, i, n, env_options), daemon=True)
+            proc.start()
+            child.close()
+            self.conns.append(parent)
+            self.procs.append(proc)
+
+    def reset(self, seed: int | None = None) -> np.ndarray:
+        """
+        全環境で新しいゲームを始める（i番目のシードはseed+i）
+        戻り値：共有メモリ上の観測配列（次のstep()で書き換わるので，残すならコピーする）
+        """
+        for i, conn in enumerate(self.conns):
+            conn.send(("reset", None if seed is None else seed + i))
+        for conn in self.conns:
+            conn.recv()
+        return self.obs
+
+    def step(self, actions) -> tuple[np.ndarray, np.ndarray, np.ndarray, list[dict]]:
+        """
+        全環境をそれぞれの行動で1回ずつ進める
+        戻り値：(観測, 報酬の配列, 終了したかの配列, 情報のリスト)
+        """
+        for conn, action in zip(self.conns, actions):
+            conn.send(("step", int(action)))
+        results = [conn.recv() for conn in self.conns]
+        rewards = np.array([r[0] for r in results], np.float32)
+        dones = np.array([r[1] for r in results], bool)
+        return self.obs, rewards, dones, [r[2] for r in results]
+
+    def close(self):
+        """
+        ワーカーを止めて共有メモリを解放する
+        """
+        for conn in self.conns:
+            try:
+                conn.send(("close", None))
+            except (BrokenPipeError, OSError):
+                pass
+        for proc in self.procs:
+            proc.join(timeout=5)
+        del self.obs
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
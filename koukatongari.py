@@ -1,9 +1,22 @@
+import hashlib
+import json
 import math
+import mmap
 import os
 import random
 import sys
 import time
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+IMPORT_START = time.perf_counter()  # 起動時間の計測の起点（pygameなどの読み込みも含める）
+
 import pygame as pg
+try:
+    import numpy as np
+except ImportError:  # NumPyがなくてもBulletEngine以外は動く
+    np = None
 
 
 
@@ -13,6 +26,7 @@ os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
 #global変数の追加
 gameround = 0
+rng = random.Random()  # ゲーム中の乱数はすべてこれを使う（Gameの生成時にシードを指定して作り直す）
 
 
 def check_bound(obj_rct: pg.Rect) -> tuple[bool, bool]:
@@ -40,6 +54,676 @@ def calc_orientation(org: pg.Rect, dst: pg.Rect) -> tuple[float, float]:
     norm = math.sqrt(x_diff**2+y_diff**2)
     return x_diff/norm, y_diff/norm
 
+class Assets:
+    """
+    画像ファイルを1度だけ読み込み，同じSurfaceを使い回すクラス
+    画面の作成後にconvert_all()を呼ぶと，画面のピクセル形式に変換したものを返すようになる
+    """
+    def __init__(self):
+        self.images = {}  # ファイル名 → Surface
+        self.loads = 0  # ファイルから読み込んだ回数
+
+    def image(self, path: str) -> pg.Surface:
+        """
+        pathの画像を返す．初回だけファイルから読み込む
+        """
+        surf = self.images.get(path)
+        if surf is None:
+            surf = asset_pack.get(path)
+            if surf is None:
+                surf = pg.image.load(path)
+                self.loads += 1
+            if pg.display.get_surface() is not None:
+                surf = self.convert(surf)
+            self.images[path] = surf
+        return surf
+
+    alpha_masks = None  # convert_alpha()で変換した後のピクセル形式
+
+    @staticmethod
+    def convert(surf: pg.Surface) -> pg.Surface:
+        """
+        透過情報を保ったまま画面のピクセル形式に変換する（AssetPackの画像など，変換済みならそのまま返す）
+        """
+        if surf.get_flags() & pg.SRCALPHA:
+            if Assets.alpha_masks is None:
+                Assets.alpha_masks = pg.Surface((1, 1), pg.SRCALPHA).convert_alpha().get_masks()
+            if surf.get_bitsize() == 32 and surf.get_masks() == Assets.alpha_masks:
+                return surf
+            return surf.convert_alpha()
+        return surf.convert()
+
+    def convert_all(self):
+        """
+        読み込み済みの画像をすべて画面のピクセル形式に変換する（set_modeの後に呼ぶ）
+        """
+        for path, surf in self.images.items():
+            self.images[path] = self.convert(surf)
+
+    def stats(self) -> dict:
+        """
+        読み込み回数・保持しているファイル数・保持しているバイト数を返す
+        """
+        nbytes = sum(surf.get_pitch() * surf.get_height() for surf in self.images.values())
+        return {"loads": self.loads, "files": len(self.images), "bytes": nbytes}
+
+
+assets = Assets()
+
+
+class LazyAsset:
+    """
+    クラス属性の画像などを，最初に参照したときに作る記述子
+    import時に画像を読み込まずに済み，画面の作成後に作れば画面のピクセル形式に変換したものから作られる
+    一度作った値はクラス属性として上書きするので，2回目以降は普通のクラス属性と同じ速さで参照できる
+
+        image = LazyAsset(lambda cls: pg.transform.rotozoom(cls.img, 0, 0.5), deps=("img",))
+
+    makeが読む別のLazyAssetはdepsに書く（書かないと，読んだ画像が変わってもAssetPackの古い画像を使ってしまう）
+    """
+    fingerprints = {}  # "クラス名.属性名" → 指紋（値に置き換わった後も，参照元の指紋を作るのに使う）
+
+    def __init__(self, make, deps: tuple[str, ...] = ()):
+        """
+        引数1 make：定義したクラスを受け取って値を返す関数
+        引数2 deps：makeが読むLazyAssetの名前（"img"なら定義したクラスの属性，"NormalWeapon.image"なら別のクラスの属性）
+        """
+        self.make = make
+        self.deps = deps
+        self.fingerprint = None  # makeと，makeが参照するLazyAssetの指紋（初めて使うときに作る）
+
+    def __set_name__(self, owner: type, name: str):
+        self.owner = owner
+        self.name = name
+
+    def digest(self) -> str:
+        """
+        makeの中身か，depsのLazyAsset（cls.imgやNormalWeapon.imageなど）の中身が変わったら変わる指紋
+        AssetPackに焼き込んだ画像がこの指紋と違えば使わない
+        """
+        if self.fingerprint is None:
+            parts = [AssetPack.fingerprint(self.make)]
+            for key, dep in self.dependencies():
+                parts.append(f"{key}:{dep.digest() if isinstance(dep, LazyAsset) else __class__.fingerprints[key]}")
+            self.fingerprint = hashlib.sha1(" ".join(parts).encode()).hexdigest()[:16]
+            __class__.fingerprints[f"{self.owner.__name__}.{self.name}"] = self.fingerprint
+        return self.fingerprint
+
+    def dependencies(self):
+        """
+        depsのLazyAssetを("クラス名.属性名", LazyAssetか置き換わった値)で列挙する
+        """
+        for dep in self.deps:
+            cls_name, _, name = dep.rpartition(".")
+            cls = self.make.__globals__[cls_name] if cls_name else self.owner
+            for base in cls.__mro__:  # 継承した属性は定義したクラスの名前で数える
+                if name in base.__dict__:
+                    key = f"{base.__name__}.{name}"
+                    attr = base.__dict__[name]
+                    if not isinstance(attr, LazyAsset) and key not in __class__.fingerprints:
+                        raise ValueError(f"{self.owner.__name__}.{self.name}: depsの{dep}はLazyAssetではない")
+                    yield key, attr
+                    break
+            else:
+                raise AttributeError(f"{self.owner.__name__}.{self.name}: depsの{dep}がない")
+
+    def __get__(self, obj, owner: type):
+        for cls in owner.__mro__:  # サブクラスから参照しても，定義したクラスの属性を置き換える
+            if cls.__dict__.get(self.name) is self:
+                value = asset_pack.get(f"{cls.__name__}.{self.name}", self.digest())
+                if value is None:
+                    value = self.make(cls)
+                elif pg.display.get_surface() is not None:
+                    value = assets.convert(value)
+                setattr(cls, self.name, value)
+                return value
+        raise AttributeError(self.name)
+
+
+# 実行中にそのまま使う元画像（変換してから使うものはLazyAssetとして焼き込まれる）
+# AssetPackに入れられるのは透過情報付きの32ビット画像だけで，カラーキーを使う画像は今までどおりfig/から読み込む
+PACK_IMAGES = ["fig/hikoki.png", "fig/8.png", "fig/beam.png", "fig/explosion.gif", "fig/explosion.png",
+               "fig/alien1.png", "fig/alien2.png", "fig/alien3.png"]
+PACK_PATH = "fig/assets.pack"
+
+
+class AssetPack:
+    """
+    変換済みの画像をまとめて1枚のアトラスにしたファイル（bake()で作る）をmmapで読み込み，画像ごとの部分Surfaceを返すクラス
+    アトラスの画素は画面のピクセル形式（BGRA）のまま保存するので，読み込み時にデコードもコピーも変換もしない
+    fig/の画像ファイルが変わっていたり，作ったときとpygameのバージョンが違ったりすればパックは使わず，今までどおり読み込んで変換する
+    ファイルの形式：MAGIC，索引（JSON）の長さ（4バイト），索引，alignバイト境界からアトラスの画素
+    """
+    magic = b"KTPACK1\n"
+    align = 4096
+
+    def __init__(self, path: str):
+        """
+        引数 path：パックファイルのパス
+        """
+        self.path = path
+        self.enabled = True
+        self.entries = None  # キー → (部分Surface, 指紋)（初回のgetで読み込む）
+        self.mmap = None
+        self.stale = None  # パックを使わなかった理由
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def fingerprint(*funcs) -> str:
+        """
+        関数の処理内容から指紋を作る（定数・呼び出す名前・バイトコードが同じなら同じ値）
+        """
+        def parts(code):
+            yield code.co_code
+            yield repr(code.co_names).encode()
+            for const in code.co_consts:
+                if isinstance(const, type(code)):  # 内包表記などの入れ子の関数
+                    yield from parts(const)
+                else:
+                    yield repr(const).encode()
+        h = hashlib.sha1()
+        for func in funcs:
+            for part in parts(func.__code__):
+                h.update(part)
+        return h.hexdigest()[:16]
+
+    def check(self, index: dict) -> str | None:
+        """
+        パックが元の画像ファイルと食い違っていればその理由を返す
+        """
+        if index.get("pygame") != pg.version.ver:
+            return f"pygame {index.get('pygame')} != {pg.version.ver}"
+        for path, (size, mtime) in index["sources"].items():
+            try:
+                st = os.stat(path)
+            except OSError:
+                return f"{path} missing"
+            if st.st_size != size or st.st_mtime_ns != mtime:
+                return f"{path} changed"
+        return None
+
+    def open(self):
+        """
+        パックファイルを読み込む（なければ，または古ければ何も登録しない）
+        """
+        self.entries = {}
+        try:
+            f = open(self.path, "rb")
+        except OSError:
+            self.stale = "missing"
+            return
+        with f:
+            if f.read(len(self.magic)) != self.magic:
+                self.stale = "format"
+                return
+            size = int.from_bytes(f.read(4), "little")
+            index = json.loads(f.read(size))
+            self.stale = self.check(index)
+            if self.stale is not None:
+                return
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)  # 書き込まれてもファイルは変わらない
+        width, height, offset = index["atlas"]
+        atlas = pg.image.frombuffer(memoryview(self.mmap)[offset:offset + width * height * 4], (width, height), "BGRA")
+        for key, (x, y, w, h, fingerprint) in index["entries"].items():
+            self.entries[key] = atlas.subsurface((x, y, w, h)), fingerprint
+
+    def contains(self, key: str, fingerprint: str | None = None) -> bool:
+        """
+        keyの画像がパックにあって，指紋が一致するか
+        """
+        if not self.enabled:
+            return False
+        if self.entries is None:
+            self.open()
+        entry = self.entries.get(key)
+        return entry is not None and (fingerprint is None or entry[1] == fingerprint)
+
+    def get(self, key: str, fingerprint: str | None = None) -> pg.Surface | None:
+        """
+        keyの画像を返す（なければNone）
+        引数1 key：元画像のパス，"クラス名.属性名"，またはアイテム画像のキー
+        引数2 fingerprint：画像を作る処理の指紋（焼き込んだときと違えば使わない）
+        """
+        if not self.contains(key, fingerprint):
+            if self.enabled:
+                self.misses += 1
+            return None
+        self.hits += 1
+        return self.entries[key][0]
+
+    def bake(self) -> dict:
+        """
+        PACK_IMAGES・全クラスのLazyAsset・ROUND_ITEMSのアイテム画像を変換した状態でアトラスにまとめてファイルに書き出す
+        画面を作ってから呼ぶ（ゲーム中と同じく，画面のピクセル形式に変換した画像から作る）
+        戻り値：書き出した画像の数・入れられなかった画像・アトラスの大きさ・ファイルの大きさ
+        """
+        self.enabled = False  # 古いパックの画像を使わずに作り直す
+        surfaces = {}  # キー → (Surface, 指紋)
+        for path in PACK_IMAGES:
+            surfaces[path] = assets.image(path), ""
+        for cls in list(globals().values()):
+            if not isinstance(cls, type) or cls.__module__ != __name__:
+                continue
+            for name, attr in list(vars(cls).items()):
+                if isinstance(attr, LazyAsset):
+                    value = getattr(cls, name)
+                    if isinstance(value, pg.Surface) and not any(value is surf for surf in assets.images.values()):
+                        surfaces[f"{cls.__name__}.{name}"] = value, attr.digest()  # 元画像そのものは入れない
+        for items in ROUND_ITEMS.values():
+            for img_name, downsize, angle, *_ in items:
+                surfaces[GetItem.pack_key(img_name, downsize, angle)] = (GetItem.item_image(img_name, downsize, angle),
+                                                                          GetItem.fingerprint)
+        skipped = [key for key, (surf, _) in surfaces.items()
+                   if not surf.get_flags() & pg.SRCALPHA or surf.get_bitsize() != 32 or surf.get_colorkey() is not None]
+        for key in skipped:
+            del surfaces[key]
+
+        # 高い順に棚（横一列）へ並べる
+        width = max([1024] + [surf.get_width() for surf, _ in surfaces.values()])
+        x = y = shelf = 0
+        entries = {}
+        for key, (surf, fingerprint) in sorted(surfaces.items(), key=lambda item: -item[1][0].get_height()):
+            w, h = surf.get_size()
+            if x + w > width:
+                x, y, shelf = 0, y + shelf, 0
+            entries[key] = [x, y, w, h, fingerprint]
+            x += w
+            shelf = max(shelf, h)
+        height = y + shelf
+        pixels = bytearray(width * height * 4)
+        for key, (surf, _) in surfaces.items():
+            x, y, w, h, _ = entries[key]
+            data = pg.image.tobytes(surf, "BGRA")
+            for row in range(h):
+                start = ((y + row) * width + x) * 4
+                pixels[start:start + w * 4] = data[row * w * 4:(row + 1) * w * 4]
+
+        sources = {}  # どの画像から作ったかを追いきれないので，同じフォルダの画像がどれか変わったら古いとみなす
+        folder = os.path.dirname(self.path)
+        for name in sorted(os.listdir(folder)):
+            if name.lower().endswith((".png", ".jpg", ".gif")):
+                st = os.stat(os.path.join(folder, name))
+                sources[f"{folder}/{name}"] = [st.st_size, st.st_mtime_ns]
+        index = {"pygame": pg.version.ver, "sources": sources, "entries": entries}
+        header = len(self.magic) + 4 + len(json.dumps({**index, "atlas": [width, height, 0]}).encode()) + 32
+        offset = -(-header // self.align) * self.align
+        index["atlas"] = [width, height, offset]
+        data = json.dumps(index).encode()
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(self.magic + len(data).to_bytes(4, "little") + data)
+            f.write(bytes(offset - f.tell()))
+            f.write(pixels)
+        os.replace(tmp, self.path)  # 実行中のゲームがmmapしている古いファイルは壊さない
+        self.enabled = True
+        self.entries = None
+        return {"entries": len(entries), "skipped": skipped, "atlas": (width, height),
+                "bytes": offset + len(pixels)}
+
+    def stats(self) -> dict:
+        """
+        読み込んだ画像の数・使わなかった理由・取り出せた回数・なかった回数を返す
+        """
+        return {"entries": len(self.entries or {}), "stale": self.stale, "hits": self.hits, "misses": self.misses}
+
+
+asset_pack = AssetPack(PACK_PATH)
+
+
+class TransformCache:
+    """
+    pg.transformの変換結果を使い回すキャッシュに関するクラス
+    元Surface・角度（angle_step度単位に丸める）・拡大率をキーに，古いものから捨てる
+    """
+    def __init__(self, maxsize: int = 512, angle_step: float = 1):
+        """
+        引数1 maxsize：保持する変換結果の最大数
+        引数2 angle_step：角度を丸める単位（度）
+        """
+        self.maxsize = maxsize
+        self.angle_step = angle_step
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def bucket(self, angle: float) -> float:
+        """
+        角度をangle_step単位に丸めて0～360度に収める
+        """
+        return round(angle / self.angle_step) * self.angle_step % 360
+
+    def get(self, key: tuple, make):
+        """
+        keyの変換結果を返す．なければmake()で作って登録する
+        """
+        surf = self.cache.get(key)
+        if surf is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return surf
+        self.misses += 1
+        surf = make()
+        self.cache[key] = surf
+        if len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+        return surf
+
+    def rotozoom(self, surf: pg.Surface, angle: float, scale: float) -> pg.Surface:
+        angle = self.bucket(angle)
+        return self.get(("rotozoom", surf, angle, scale), lambda: pg.transform.rotozoom(surf, angle, scale))
+
+    def rotate(self, surf: pg.Surface, angle: float) -> pg.Surface:
+        angle = self.bucket(angle)
+        return self.get(("rotate", surf, angle), lambda: pg.transform.rotate(surf, angle))
+
+    def scale(self, surf: pg.Surface, size: tuple[int, int]) -> pg.Surface:
+        return self.get(("scale", surf, tuple(size)), lambda: pg.transform.scale(surf, size))
+
+    def smoothscale(self, surf: pg.Surface, size: tuple[int, int]) -> pg.Surface:
+        return self.get(("smoothscale", surf, tuple(size)), lambda: pg.transform.smoothscale(surf, size))
+
+    def flip(self, surf: pg.Surface, flip_x: bool, flip_y: bool) -> pg.Surface:
+        return self.get(("flip", surf, bool(flip_x), bool(flip_y)), lambda: pg.transform.flip(surf, flip_x, flip_y))
+
+    def atlas(self, surf: pg.Surface, step: int) -> list[pg.Surface]:
+        """
+        step度ずつ回転させた画像を一周分まとめて返す（回転し続ける武器用）
+        i番目の画像は step*i 度回転したもの
+        """
+        step = math.gcd(int(step), 360) or 1
+        return self.get(("atlas", surf, step), lambda: [pg.transform.rotate(surf, a) for a in range(0, 360, step)])
+
+    def stats(self) -> dict:
+        """
+        ヒット数・ミス数・保持数を返す
+        """
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.cache)}
+
+
+transforms = TransformCache()
+
+
+class TextCache:
+    """
+    フォントと文字列の描画結果を使い回すキャッシュに関するクラス
+    """
+    def __init__(self, maxsize: int = 256):
+        """
+        引数 maxsize：保持する描画結果の最大数
+        """
+        self.maxsize = maxsize
+        self.fonts = {}  # (フォント名, 大きさ) → Font
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def font(self, name: str | None, size: int) -> pg.font.Font:
+        """
+        pg.font.Font(name, size)を1度だけ生成して返す
+        """
+        font = self.fonts.get((name, size))
+        if font is None:
+            font = self.fonts[(name, size)] = pg.font.Font(name, size)
+        return font
+
+    def render(self, font: pg.font.Font, text: str, antialias: bool, color: tuple[int, int, int]) -> pg.Surface:
+        """
+        font.render(text, antialias, color)の結果を返す
+        """
+        key = (font, text, bool(antialias), tuple(color))
+        surf = self.cache.get(key)
+        if surf is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return surf
+        self.misses += 1
+        surf = self.cache[key] = font.render(text, antialias, color)
+        if len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+        return surf
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.cache)}
+
+
+text_cache = TextCache()
+
+
+class FontPaths:
+    """
+    フォント名から探したフォントファイルのパスをディスクに保存しておくクラス
+    pg.font.SysFontは呼ぶたびにシステムのフォント一覧を走査する（遅い）ので，2回目以降の起動では保存したパスを使う
+    保存したファイルが消えていれば探し直す（見つからなかったフォント名はNoneとして保存し，既定のフォントを使う）
+    """
+    def __init__(self, path: str):
+        """
+        引数 path：フォント名 → パスを保存するJSONのパス
+        """
+        self.path = path
+        self.paths = None  # フォント名 → フォントファイルのパス（初回のresolveで読み込む）
+        self.scans = 0  # システムのフォント一覧から探した回数
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.paths = json.load(f)
+        except (OSError, ValueError):
+            self.paths = {}
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self.paths, f, ensure_ascii=False, indent=1)
+        except OSError:  # 保存できなくても次回また探すだけ
+            pass
+
+    def resolve(self, name: str) -> str | None:
+        """
+        フォント名nameのファイルのパスを返す（見つからなければNone）
+        """
+        if self.paths is None:
+            self.load()
+        if name in self.paths:
+            path = self.paths[name]
+            if path is None or os.path.exists(path):
+                return path
+        path = pg.font.match_font(name)
+        self.scans += 1
+        self.paths[name] = path
+        self.save()
+        return path
+
+    def font(self, name: str, size: int) -> pg.font.Font:
+        """
+        pg.font.SysFont(name, size)と同じフォントを返す
+        """
+        if not pg.font.get_init():
+            pg.font.init()
+        return text_cache.font(self.resolve(name), size)
+
+
+FONT_CACHE = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "koukatongari", "fonts.json")
+font_paths = FontPaths(FONT_CACHE)
+
+
+class StartupTimer:
+    """
+    起動にかかった時間（コールドスタートの遅延）を記録するクラス
+    import：モジュールの読み込み完了，first_frame：最初の画面（タイトル）の表示，
+    first_interactive：操作できる最初のゲーム画面の表示までの秒数を，IMPORT_STARTから測る
+    タイトル画面でキーを押すまでの待ち時間は含めない
+    """
+    def __init__(self, origin: float):
+        self.origin = origin
+        self.idle = 0.0  # ユーザーの入力を待っていた秒数
+        self.marks = {}  # 名前 → 起点からの秒数
+
+    def mark(self, name: str):
+        """
+        nameの時刻を記録する（2回目以降は無視する）
+        """
+        if name not in self.marks:
+            self.marks[name] = time.perf_counter() - self.origin - self.idle
+
+    def wait(self, seconds: float):
+        """
+        入力待ちの時間secondsを以降の記録から除く
+        """
+        self.idle += seconds
+
+    def report(self) -> dict:
+        """
+        記録した時刻をミリ秒の辞書で返す
+        """
+        return {name: round(t * 1000, 1) for name, t in self.marks.items()}
+
+
+startup = StartupTimer(IMPORT_START)
+
+
+class MaskCache:
+    """
+    ピクセル単位の当たり判定に使うpg.maskを元Surfaceごとに1度だけ作って使い回すキャッシュに関するクラス
+    スプライトの画像は共有・キャッシュされたSurfaceなので，毎フレーム作り直さずに済む
+    """
+    def __init__(self, maxsize: int = 512):
+        """
+        引数 maxsize：保持するマスクの最大数
+        """
+        self.maxsize = maxsize
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, surf: pg.Surface) -> pg.mask.Mask:
+        """
+        surfのマスクを返す
+        """
+        mask = self.cache.get(surf)
+        if mask is not None:
+            self.hits += 1
+            self.cache.move_to_end(surf)
+            return mask
+        self.misses += 1
+        mask = self.cache[surf] = pg.mask.from_surface(surf)
+        if len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+        return mask
+
+    def overlap(self, img_a: pg.Surface, rect_a: pg.Rect, img_b: pg.Surface, rect_b: pg.Rect) -> bool:
+        """
+        rect_aの位置のimg_aとrect_bの位置のimg_bの不透明な部分が重なるか
+        """
+        offset = (rect_b.left - rect_a.left, rect_b.top - rect_a.top)
+        return self.get(img_a).overlap(self.get(img_b), offset) is not None
+
+    @staticmethod
+    def circle_rect(center: tuple[int, int], radius: int, rect: pg.Rect) -> bool:
+        """
+        円とrectが重なるか
+        """
+        cx, cy = center
+        dx = cx - max(rect.left, min(cx, rect.right))
+        dy = cy - max(rect.top, min(cy, rect.bottom))
+        return dx * dx + dy * dy < radius * radius
+
+    def collide(self, a: pg.sprite.Sprite, b: pg.sprite.Sprite) -> bool:
+        """
+        スプライトaとbが見た目どおりに重なるか（pg.sprite.spritecollideのcollidedにも使える）
+        矩形が重ならなければすぐにFalse，円形の爆弾（hit_radiusを持つもの）は円と矩形で判定し，
+        それ以外はマスクを比べる
+        """
+        rect_a, rect_b = a.rect, b.rect
+        if not rect_a.colliderect(rect_b):
+            return False
+        radius = getattr(b, "hit_radius", None)
+        if radius is not None:
+            return self.circle_rect(rect_b.center, radius, rect_a)
+        radius = getattr(a, "hit_radius", None)
+        if radius is not None:
+            return self.circle_rect(rect_a.center, radius, rect_b)
+        return self.overlap(a.image, rect_a, b.image, rect_b)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.cache)}
+
+
+masks = MaskCache()
+
+
+class SpritePool:
+    """
+    倒された（kill()された）スプライトを捨てずに再利用するプール
+    """
+    def __init__(self, cls: type, cap: int = 256):
+        """
+        引数1 cls：プールするスプライトのクラス（Pooledを継承したもの）
+        引数2 cap：保持する空きスプライトの最大数（0でプールしない）
+        """
+        self.cls = cls
+        self.cap = cap
+        self.free = []
+        self.hits = 0  # 空きスプライトを再利用した回数
+        self.misses = 0  # 空きがなく新しく生成した回数
+        self.drops = 0  # capを超えたため捨てた回数
+        cls.pool = self
+
+    def acquire(self, *args, **kwargs):
+        """
+        空きスプライトをreset()して返す．空きがなければ新しく生成する
+        """
+        if self.free:
+            sprite = self.free.pop()
+            sprite.reset(*args, **kwargs)
+            self.hits += 1
+            return sprite
+        self.misses += 1
+        return self.cls(*args, **kwargs)
+
+    def release(self, sprite: pg.sprite.Sprite):
+        """
+        kill()されたスプライトを空きリストに戻す
+        """
+        if len(self.free) < self.cap:
+            self.free.append(sprite)
+        else:
+            self.drops += 1
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "drops": self.drops, "free": len(self.free)}
+
+
+class Pooled:
+    """
+    SpritePoolで再利用するスプライトの共通処理
+    サブクラスは初期化処理をreset()に書き，spawn()で生成する
+    """
+    pool = None
+
+    @classmethod
+    def spawn(cls, *args, **kwargs):
+        """
+        プールがあればプールから，なければ新しくスプライトを生成する
+        """
+        pool = cls.__dict__.get("pool")
+        if pool is None:
+            return cls(*args, **kwargs)
+        return pool.acquire(*args, **kwargs)
+
+    def kill(self):
+        """
+        全グループから外し，自分のクラスのプールに戻す
+        """
+        if not self.alive():
+            return
+        super().kill()
+        pool = type(self).__dict__.get("pool")
+        if pool is not None:
+            pool.release(self)
+
+
 class Bird(pg.sprite.Sprite):
     """
     ゲームキャラクター（飛行機）に関するクラス
@@ -58,17 +742,17 @@ class Bird(pg.sprite.Sprite):
         引数2 xy：飛行機画像の位置座標タプル
         """
         super().__init__()
-        img0 = pg.transform.rotozoom(pg.image.load(f"fig/hikoki.png"), 0, 0.15)
-        img = pg.transform.flip(img0, True, False)  # デフォルトの飛行機
+        img0 = transforms.rotozoom(assets.image(f"fig/hikoki.png"), 0, 0.15)
+        img = transforms.flip(img0, True, False)  # デフォルトの飛行機
         self.imgs = {
             (+1, 0): img,  # 右
-            (+1, -1): pg.transform.rotozoom(img, 45, 1.0),  # 右上
-            (0, -1): pg.transform.rotozoom(img, 90, 1.0),  # 上
-            (-1, -1): pg.transform.rotozoom(img0, -45, 1.0),  # 左上
+            (+1, -1): transforms.rotozoom(img, 45, 1.0),  # 右上
+            (0, -1): transforms.rotozoom(img, 90, 1.0),  # 上
+            (-1, -1): transforms.rotozoom(img0, -45, 1.0),  # 左上
             (-1, 0): img0,  # 左
-            (-1, +1): pg.transform.rotozoom(img0, 45, 1.0),  # 左下
-            (0, +1): pg.transform.rotozoom(img, -90, 1.0),  # 下
-            (+1, +1): pg.transform.rotozoom(img, -45, 1.0),  # 右下
+            (-1, +1): transforms.rotozoom(img0, 45, 1.0),  # 左下
+            (0, +1): transforms.rotozoom(img, -90, 1.0),  # 下
+            (+1, +1): transforms.rotozoom(img, -45, 1.0),  # 右下
         }
         self.hp = 5
         self.dire = (0, -1)
@@ -78,26 +762,29 @@ class Bird(pg.sprite.Sprite):
         self.speed = 10
         self.state = "normal"
         self.is_invincible = False
-        
-    def blink(self, screen):
+        self.blink_timer = 0  # 点滅の残りフレーム数
+
+    def blink(self, duration: int = 5):
         """
         飛行機が攻撃を受けた時に一瞬だけ戦败时の图片に変え、その後元の画像に戻る
+        引数 duration：画像を変えておくフレーム数（その間は無敵）
         """
+        if self.blink_timer == 0:
+            self.original_image = self.image
         self.is_invincible = True
-        original_image = self.image
-        self.image = pg.transform.rotozoom(pg.image.load(f"fig/8.png"), 0, 2.0)  # 戦败时的图片
-        screen.blit(self.image, self.rect)
-        pg.display.update()
-        time.sleep(0.1)
-        self.image = original_image
-        self.is_invincible = False
+        self.image = transforms.rotozoom(assets.image(f"fig/8.png"), 0, 2.0)  # 戦败时的图片
+        self.blink_timer = duration
 
-    def update(self, key_lst: list[bool], screen: pg.Surface):
+    def update(self, key_lst: list[bool]):
         """
         押下キーに応じて飛行機を移動させる
-        引数1 key_lst：押下キーの真理値リスト
-        引数2 screen：画面Surface
+        引数 key_lst：押下キーの真理値リスト
         """
+        if self.blink_timer > 0:
+            self.blink_timer -= 1
+            if self.blink_timer == 0:
+                self.image = self.original_image
+                self.is_invincible = False
         sum_mv = [0, 0]
         if  key_lst[pg.K_LSHIFT]:
                 self.speed = 20
@@ -110,25 +797,30 @@ class Bird(pg.sprite.Sprite):
         self.rect.move_ip(self.speed*sum_mv[0], self.speed*sum_mv[1])
         if check_bound(self.rect) != (True, True):
             self.rect.move_ip(-self.speed*sum_mv[0], -self.speed*sum_mv[1])
-        
-        screen.blit(self.image, self.rect)
 
 
-class Bomb(pg.sprite.Sprite):
+class Bomb(Pooled, pg.sprite.Sprite):
     """
     爆弾に関するクラス
     """
     colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0), (255, 0, 255), (0, 255, 255)]
-    bossbeam_image=pg.transform.rotozoom(pg.image.load(f"fig/beam2.png"), 0, 0.03)  # ボスの攻撃の弾画像読み込み
-    bossscull_image = pg.transform.rotozoom(pg.image.load(f"fig/bone.png"), 0, 0.03)  # ボスの攻撃の弾の画像読み込み
+    bossbeam_image = LazyAsset(lambda cls: pg.transform.rotozoom(assets.image(f"fig/beam2.png"), 0, 0.03))  # ボスの攻撃の弾画像
+    bossscull_image = LazyAsset(lambda cls: pg.transform.rotozoom(assets.image(f"fig/bone.png"), 0, 0.03))  # ボスの攻撃の弾の画像
+    circles = {}  # (半径, 色) → 爆弾円Surface
+    speeds = [6, 9, 12, 18, 10]  # ラウンドごとの爆弾の速度（roundごとに早くする，ボス戦は10）
+    engine = None  # 移動を任せているBulletEngine
+    slot = None  # BulletEngine内での番号
 
     def __init__(self, emy: "Enemy", bird: Bird, mode=0):
+        super().__init__()
+        self.reset(emy, bird, mode)
+
+    def reset(self, emy: "Enemy", bird: Bird, mode=0):
         """
         爆弾円Surfaceを生成する
         引数1 emy：爆弾を投下する敵機
         引数2 bird：攻撃対象の飛行機
         """
-        super().__init__()
         self.mode = mode
         if self.mode==2:
             self.hit = "nohit"  # ボムとビームの当たり判定なし
@@ -136,14 +828,12 @@ class Bomb(pg.sprite.Sprite):
         else:
             self.hit = "hit"
             if self.mode == 0:
-                rad = random.randint(10, 50)  # 爆弾円の半径：10以上50以下の乱数
-            
-                self.image = pg.Surface((2*rad, 2*rad))
-                color = random.choice(__class__.colors)  # 爆弾円の色：クラス変数からランダム選択
-                pg.draw.circle(self.image, color, (rad, rad), rad)
-                self.image.set_colorkey((0, 0, 0))
+                rad = rng.randint(10, 50)  # 爆弾円の半径：10以上50以下の乱数
+                color = rng.choice(__class__.colors)  # 爆弾円の色：クラス変数からランダム選択
+                self.image = __class__.circle(rad, color)
             else:
                 self.image = __class__.bossbeam_image
+        self.hit_radius = rad if self.mode == 0 else None  # 円形の爆弾は円で当たり判定する
             
         vlst = [(0, 1), (1, 1), (1, 0), (-1, 0), (-1, 1)]
         
@@ -151,29 +841,43 @@ class Bomb(pg.sprite.Sprite):
         # 爆弾を投下するemyから見た攻撃対象のbirdの方向を計算
         self.vx, self.vy = calc_orientation(emy.rect, bird.rect)
         if self.mode == 3:
-            self.vx, self.vy =  random.choice(vlst)
+            self.vx, self.vy =  rng.choice(vlst)
         self.rect.centerx = emy.rect.centerx
         self.rect.centery = emy.rect.centery+emy.rect.height//2
-        if gameround == 0:  #爆弾の速度をroundごとに早くする
-            self.speed = 6
-        elif gameround == 1:
-            self.speed = 9
-        elif gameround == 2:
-            self.speed = 12
-        elif gameround == 3:
-            self.speed = 18
-        else:
-            self.speed = 10
+        self.speed = __class__.speeds[min(gameround, 4)]
         self.state = "active"
         self.count = 0
         
         
 
+    @classmethod
+    def circle(cls, rad: int, color: tuple[int, int, int]) -> pg.Surface:
+        """
+        半径rad，色colorの爆弾円Surfaceを返す（同じ組み合わせは使い回す）
+        """
+        img = cls.circles.get((rad, color))
+        if img is None:
+            img = pg.Surface((2*rad, 2*rad))
+            pg.draw.circle(img, color, (rad, rad), rad)
+            img.set_colorkey((0, 0, 0))
+            cls.circles[(rad, color)] = img
+        return img
+
+    def kill(self):
+        """
+        BulletEngineに登録されていれば取り除いてから消す
+        """
+        if self.slot is not None:
+            self.engine.remove(self.slot)
+        super().kill()
+
     def update(self):
         """
         爆弾を速度ベクトルself.vx, self.vyに基づき移動させる
         引数 screen：画面Surface
         """
+        if self.slot is not None:  # BulletEngineがまとめて動かす
+            return
         if self.mode != 0:
             if self.rect.left < 0:
                 self.vx *= -1
@@ -199,7 +903,7 @@ class Beam(pg.sprite.Sprite):
         super().__init__()
         self.vx, self.vy = bird.dire
         angle = math.degrees(math.atan2(-self.vy, self.vx))
-        self.image = pg.transform.rotozoom(pg.image.load(f"fig/beam.png"), angle, 2.0)
+        self.image = transforms.rotozoom(assets.image(f"fig/beam.png"), angle, 2.0)
         self.vx = math.cos(math.radians(angle))
         self.vy = -math.sin(math.radians(angle))
         self.rect = self.image.get_rect()
@@ -217,19 +921,22 @@ class Beam(pg.sprite.Sprite):
             self.kill()
 
 
-class Explosion(pg.sprite.Sprite):
+class Explosion(Pooled, pg.sprite.Sprite):
     """
     爆発に関するクラス
     """
     def __init__(self, obj: "Bomb|Enemy", life: int):
+        super().__init__()
+        self.reset(obj, life)
+
+    def reset(self, obj: "Bomb|Enemy", life: int):
         """
         爆弾が爆発するエフェクトを生成する
         引数1 obj：爆発するBombまたは敵機インスタンス
         引数2 life：爆発時間
         """
-        super().__init__()
-        img = pg.image.load(f"fig/explosion.gif")
-        self.imgs = [img, pg.transform.flip(img, 1, 1)]
+        img = assets.image(f"fig/explosion.gif")
+        self.imgs = [img, transforms.flip(img, 1, 1)]
         self.image = self.imgs[0]
         self.rect = self.image.get_rect(center=obj.rect.center)
         self.life = life
@@ -249,47 +956,42 @@ class Enemy(pg.sprite.Sprite):
     """
     敵機に関するクラス
     """
-    imgs = [pg.image.load(f"fig/alien{i}.png") for i in range(1, 4)]
-    
+    imgs = LazyAsset(lambda cls: [assets.image(f"fig/alien{i}.png") for i in range(1, 4)])
+    speeds = [6, 12, 18, 24]  # ラウンドごとの降下速度（ラウンド3以降は24）
+    intervals = [300, 250, 200, 150]  # ラウンドごとの爆弾投下間隔の上限
+    stay_frames = 500  # 停止してから画面の下へ立ち去るまでのフレーム数（敵機が溜まり続けないようにする）
+    states = ("down", "stop", "leave")  # 降下状態，停止状態，退場状態
+
     def __init__(self):
         super().__init__()
-        self.image = random.choice(__class__.imgs)
+        self.image = rng.choice(__class__.imgs)
         self.rect = self.image.get_rect()
-        self.rect.center = random.randint(0, WIDTH), 0
-        if gameround == 0:
-            self.vx, self.vy = 0, +6
-            self.bound = random.randint(50, HEIGHT//2)  # 停止位置
-            self.state = "down"  # 降下状態or停止状態
-            self.interval = random.randint(50, 300)
-        elif gameround == 1:
-            self.vx, self.vy = 0, +12
-            self.bound = random.randint(50, HEIGHT//2)  # 停止位置
-            self.state = "down"  # 降下状態or停止状態
-            self.interval = random.randint(50, 250)
-        elif gameround == 2:
-            self.vx, self.vy = 0, +18
-            self.bound = random.randint(50, HEIGHT//2)  # 停止位置
-            self.state = "down"  # 降下状態or停止状態
-            self.interval = random.randint(50, 200)
-        else:
-            self.vx, self.vy = 0, +24
-            self.bound = random.randint(50, HEIGHT//2)  # 停止位置
-            self.state = "down"  # 降下状態or停止状態
-            self.interval = random.randint(50, 150)
-
-    def update(self):
+        self.rect.center = rng.randint(0, WIDTH), 0
+        self.speed = __class__.speeds[min(gameround, 3)]
+        self.vx, self.vy = 0, +self.speed
+        self.bound = rng.randint(50, HEIGHT//2)  # 停止位置
+        self.state = "down"
+        self.interval = rng.randint(50, __class__.intervals[min(gameround, 3)])
+        self.stay = __class__.stay_frames
+
+    def update(self, turn: bool = False):
         """
-        敵機を速度ベクトルself.vyに基づき移動（降下）させる
-        ランダムに決めた停止位置_boundまで降下したら，_stateを停止状態に変更する
-        引数 screen：画面Surface
+        敵機を速度ベクトルself.vx，self.vyに基づき移動（降下）させる
+        ランダムに決めた停止位置boundまで降下したら停止状態にし，stay_framesフレーム後に画面の下へ立ち去らせる
+        引数 turn：ラウンド2以降の左右の揺れの向き（EnemyGroupが全敵機分をまとめて乱数で決める）
         """
-        if self.rect.centery > self.bound:
+        if self.state == "down" and self.rect.centery > self.bound:
             self.vy = 0
             self.state = "stop"
+        elif self.state == "stop":
+            self.stay -= 1
+            if self.stay <= 0:
+                self.vy = self.speed
+                self.state = "leave"
         self.rect.move_ip(self.vx, self.vy)
-        
+
         if gameround >= 2:
-            self.vx += 1.5 if random.choice([True,False]) else -2
+            self.vx += 1.5 if turn else -2
             self.rect.move_ip(self.vx, self.vy)
             if self.rect.left < 0:
                 self.rect.left = 0
@@ -297,9 +999,28 @@ class Enemy(pg.sprite.Sprite):
             if self.rect.right > WIDTH :
                 self.rect.right = WIDTH
                 self.vx = 1
-            if self.rect.centery > self.bound:
+            if self.state == "down" and self.rect.centery > self.bound:
                 self.vy = 0
                 self.state = "stop"
+        if self.rect.top > HEIGHT:
+            self.kill()
+
+
+class EnemyGroup(pg.sprite.Group):
+    """
+    敵機のグループ．update()で全敵機の移動をまとめて行う
+    左右の揺れの向きは1フレームに1回だけ乱数を引いて（getrandbits）全敵機分を決める
+    実際のゲームでは敵機は多くても11体ほどなので，1体ずつEnemy.updateで動かす
+    （NumPyの配列でまとめて動かす処理は，11体で約4倍遅く，80体ほどでようやく並んだので使わない）
+    """
+    def update(self):
+        """
+        全敵機を1フレーム分動かす．i番目（グループに加えた順）の敵機の揺れの向きは乱数のiビット目
+        """
+        emys = self.sprites()
+        bits = rng.getrandbits(len(emys)) if gameround >= 2 and emys else 0
+        for i, emy in enumerate(emys):
+            emy.update(bits >> i & 1)
 
 
 class Score:
@@ -309,69 +1030,183 @@ class Score:
     敵機：10点
     """
     def __init__(self):
-        self.font = pg.font.Font(None, 50)
+        self.font = text_cache.font(None, 50)
         self.color = (0, 0, 255)
         self.value = 0
-        self.image = self.font.render(f"Score: {self.value}", 0, self.color)
+        self.image = self.render()
         self.rect = self.image.get_rect()
         self.rect.center = 100, HEIGHT-50
 
-    def update(self, screen: pg.Surface):
-        self.image = self.font.render(f"Score: {self.value}", 0, self.color)
-        screen.blit(self.image, self.rect)
+    def render(self) -> pg.Surface:
+        """
+        現在のスコアの文字画像を返す
+        """
+        self.image = text_cache.render(self.font, f"Score: {self.value}", 0, self.color)
+        return self.image
 
 
 # 各ラウンドの背景と移動   
+# ラウンドを終えたときに出すアイテム（GetItemの引数：画像，縮小後の大きさ，角度，位置，アイテム名，説明）
+ROUND_ITEMS = {
+    0: [("fig/boomerang.png", 100, 0, (WIDTH/4, 100), "boomerang", "武器に回転するブーメランを追加"),
+        ("fig/slash_effect.png", 100, 0, (WIDTH-WIDTH/4, 100), "slash", "武器に斬撃を追加")],
+    1: [("fig/satellite_shield.png", 100, 0, (WIDTH/2, 100), "satellite", "周回するシールドを生成")],
+    2: [("fig/shootingsatellite.png", 100, 0, (WIDTH-WIDTH/4, 100), "satellite", "シールドが衛星に変化し弾を発射するようになる"),
+        ("fig/penet_bullet.png", 100, 90, (WIDTH/4, 100), "weapon_mode", "弾が敵や爆弾を貫通するようになる")],
+    3: [("fig/weapon_up.png", 100, 0, (WIDTH/4, 100), "rate_up", "連射速度がUP"),
+        ("fig/hato.png", 100, 0, (WIDTH-WIDTH/4, 100), "homing", "敵を追いかけるハトを発射する")],
+}
+
+
+class RoundAssets:
+    """
+    ラウンドごとの背景とそのラウンドの終わりに出すアイテムの画像を，別スレッドで先に読み込んでおくクラス
+    タイトル画面やラウンドのトランジション中に次のラウンドの分を読み込み始め，
+    保持するのは最大residentラウンド分まで（古いラウンドから捨てる）
+    """
+    def __init__(self, resident: int = 2):
+        """
+        引数 resident：画像を保持しておくラウンド数（現在と次のラウンドの分として2以上）
+        """
+        self.resident = resident
+        self.rounds = OrderedDict()  # ラウンド番号 → {パス: 読み込み中のFuture}
+        self.surfaces = {}  # パス → 画面のピクセル形式に変換したSurface
+        self.executor = None  # 読み込み用のスレッド（最初に使うときに作る）
+        self.loads = 0
+        self.waits = 0  # 読み込みが間に合わず待った回数
+        self.evictions = 0
+
+    @staticmethod
+    def files(rnd: int) -> list[str]:
+        """
+        ラウンドrndで使う画像のパス
+        """
+        return [f"fig/round{rnd + 1}.jpg"] + [item[0] for item in ROUND_ITEMS.get(rnd, [])
+                                              if not GetItem.packed(*item[:3])]  # パックにあれば元画像はいらない
+
+    def load(self, path: str) -> pg.Surface:
+        """
+        読み込み用のスレッドで画像をデコードする（ファイルがなければ例外をFutureに残す）
+        """
+        self.loads += 1
+        return pg.image.load(path)
+
+    def prefetch(self, rnd: int):
+        """
+        ラウンドrndの画像の読み込みを別スレッドで始める
+        """
+        if not 0 <= rnd <= 4:
+            return
+        if rnd in self.rounds:
+            self.rounds.move_to_end(rnd)
+            return
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="round-assets")
+        self.rounds[rnd] = {path: self.executor.submit(self.load, path) for path in self.files(rnd)}
+        while len(self.rounds) > self.resident:
+            _, futures = self.rounds.popitem(last=False)
+            for path in futures:
+                self.surfaces.pop(path, None)
+            self.evictions += 1
+
+    def image(self, path: str, rnd: int) -> pg.Surface:
+        """
+        ラウンドrndの画像pathを返す．読み込みが終わっていなければ待つ
+        """
+        surf = self.surfaces.get(path)
+        if surf is not None:
+            return surf
+        if rnd not in self.rounds:  # 捨てた後にまた使う場合
+            self.prefetch(rnd)
+        future = self.rounds[rnd].get(path)
+        if future is None:  # このラウンドの画像ではない
+            return assets.image(path)
+        if not future.done():
+            self.waits += 1
+        surf = future.result()
+        if pg.display.get_surface() is not None:
+            surf = assets.convert(surf)
+        self.surfaces[path] = surf
+        return surf
+
+    def background(self, rnd: int) -> pg.Surface:
+        """
+        ラウンドrndの背景を返す
+        """
+        return self.image(f"fig/round{rnd + 1}.jpg", rnd)
+
+    def stats(self) -> dict:
+        """
+        読み込み回数・待った回数・捨てたラウンド数・保持しているラウンドとバイト数を返す
+        """
+        nbytes = sum(surf.get_pitch() * surf.get_height() for surf in self.surfaces.values())
+        return {"loads": self.loads, "waits": self.waits, "evictions": self.evictions,
+                "rounds": list(self.rounds), "bytes": nbytes}
+
+
+round_assets = RoundAssets()
+
+
 class Round:
-    def __init__(self):
-        self.current_round = 0 # 現在のラウンド番号
-        self.backgrounds = [pg.image.load(f"fig/round{i}.jpg") for i in range(1, 6)]
+    def __init__(self, start_round: int = 0):
+        self.current_round = start_round # 現在のラウンド番号
+        round_assets.prefetch(start_round)
+        round_assets.prefetch(start_round + 1)  # 次のラウンドの分もトランジション中に読み込んでおく
         self.bg_pos = -HEIGHT # 背景画像の位置(画面外)
         self.transition_time = 120 # トランジションの時間
         self.is_transitioning = True
         self.required_scores = [0, 50, 150, 300, 500]  # 各ラウンドに必要なスコア
 
-    def update(self, screen, score, items):
+    def update(self, score, items):
+        """
+        トランジションとラウンドの更新
+        """
         if self.is_transitioning:
             if self.transition_time > 60:  # 最初の1秒間は黒画面にテキスト表示
                 self.transition_time -= 1
-                screen.fill((0, 0, 0)) # 画面を黒で塗りつぶす
-                font = pg.font.Font(None, 64)
-                if self.current_round == 4: # 最終ラウンド
-                    text = font.render("Final Round", True, (255, 255, 255))
-                else: # 1～4ラウンド
-                    text = font.render(f"Round{self.current_round + 1}", True, (255, 255, 255))
-                text_rect = text.get_rect(center=(WIDTH//2, HEIGHT//2))
-                screen.blit(text, text_rect)
             elif self.transition_time > 0:  # 次の1秒間で背景をスライドイン
                 self.transition_time -= 1
                 self.bg_pos += HEIGHT / 60  # 1秒(60フレーム)かけて画面を下に移動
-                screen.blit(self.backgrounds[self.current_round], (0, self.bg_pos))
             else:
                 self.is_transitioning = False
                 self.bg_pos = 0
-        else:
-            screen.blit(self.backgrounds[self.current_round], (0, 0))
 
         # スコアに基づいてラウンドを更新
         if self.current_round < 4 and score.value >= self.required_scores[self.current_round + 1]:
             self.next_round(items)
 
+    def draw(self, screen):
+        """
+        背景（トランジション中はラウンド名かスライドイン中の背景）を描画する
+        """
+        if not self.is_transitioning:
+            screen.blit(self.background(), (0, 0))
+        elif self.transition_time >= 60:
+            screen.fill((0, 0, 0)) # 画面を黒で塗りつぶす
+            font = text_cache.font(None, 64)
+            if self.current_round == 4: # 最終ラウンド
+                text = text_cache.render(font, "Final Round", True, (255, 255, 255))
+            else: # 1～4ラウンド
+                text = text_cache.render(font, f"Round{self.current_round + 1}", True, (255, 255, 255))
+            text_rect = text.get_rect(center=(WIDTH//2, HEIGHT//2))
+            screen.blit(text, text_rect)
+        else:
+            screen.blit(self.background(), (0, self.bg_pos))
+
+    def background(self) -> pg.Surface:
+        """
+        現在のラウンドの背景
+        """
+        return round_assets.background(self.current_round)
+
     def next_round(self, items):
         global gameround
         if self.current_round < 4:
-            if self.current_round == 0:
-                items.add(GetItem("fig/boomerang.png", downsize=100, angle=0, xy=(WIDTH/4, 100), item_name="boomerang", item_text="武器に回転するブーメランを追加"))
-                items.add(GetItem("fig/slash_effect.png", downsize=100, angle=0, xy=(WIDTH-WIDTH/4, 100), item_name="slash", item_text="武器に斬撃を追加"))
-            elif self.current_round == 1:
-                items.add(GetItem("fig/satellite_shield.png", downsize=100, angle=0, xy=(WIDTH/2, 100), item_name="satellite", item_text="周回するシールドを生成"))
-            elif self.current_round == 2:
-                 items.add(GetItem("fig/shootingsatellite.png", downsize=100, angle=0, xy=(WIDTH-WIDTH/4, 100), item_name="satellite", item_text="シールドが衛星に変化し弾を発射するようになる"))
-                 items.add(GetItem("fig/penet_bullet.png", downsize=100, angle=90, xy=(WIDTH/4, 100), item_name="weapon_mode", item_text="弾が敵や爆弾を貫通するようになる"))
-            elif self.current_round == 3:
-                items.add(GetItem("fig/weapon_up.png", downsize=100, angle=0, xy=(WIDTH/2, 100), item_name="rate_up", item_text="連射速度がUP"))
+            for args in ROUND_ITEMS.get(self.current_round, []):
+                items.add(GetItem(*args, rnd=self.current_round))
             gameround += 1
             self.current_round += 1
+            round_assets.prefetch(self.current_round + 1)  # トランジション中に次のラウンドの分を読み込む
             self.is_transitioning = True
             self.transition_time = 120  # 2秒間のトランジション（1秒テキスト表示 + 1秒背景スライド）
             self.bg_pos = -HEIGHT  # 背景位置をリセット
@@ -382,7 +1217,7 @@ def show_title_screen(screen):
     タイトル画面を表示する関数
     引数 screen：画面Surface
     """
-    font = pg.font.SysFont("hgp創英角ﾎﾟｯﾌﾟ体", 50)
+    font = font_paths.font("hgp創英角ﾎﾟｯﾌﾟ体", 50)
     title = font.render("鳥の悪魔討伐", True, (255, 255, 255))
     instruction = font.render("Press S to Start", True, (255, 255, 255))
     
@@ -397,8 +1232,8 @@ def show_title_screen(screen):
 
  #ボスクラス
 class Boss(pg.sprite.Sprite):
-    img = pg.transform.rotozoom(pg.image.load(f"fig/bosstoka.png"), 0, 2.0)
-    img2 = pg.transform.rotozoom(pg.image.load(f"fig/boss2.png"), 0, 2.0)
+    img = LazyAsset(lambda cls: pg.transform.rotozoom(assets.image(f"fig/bosstoka.png"), 0, 2.0))
+    img2 = LazyAsset(lambda cls: pg.transform.rotozoom(assets.image(f"fig/boss2.png"), 0, 2.0))
 
     def __init__(self, hp: int):
         super().__init__()
@@ -414,8 +1249,9 @@ class Boss(pg.sprite.Sprite):
         self.boss_mode = "yowayowa"   
         
     def update(self, hp: int):
+        bits = rng.getrandbits(2)  # 1回の乱数で左右・上下の揺れの向きを決める
         # ボスの動き（例えば左右に移動）
-        self.vx += 5 if random.choice([True, False]) else -5
+        self.vx += 5 if bits & 1 else -5
         self.rect.move_ip(self.vx, self.vy)
         # 画面の端を超えないように
         if self.boss_mode == "yowayowa":  # ボスの第一段階動き範囲指定
@@ -429,7 +1265,7 @@ class Boss(pg.sprite.Sprite):
                 self.vy = 0
                 self.state = "stop"
         else:  # ボスの第二、三段階動き範囲指定、速度指定兼制限
-            self.vy += 5 if random.choice([True, False]) else -5  # 速度をランダムで増減させる
+            self.vy += 5 if bits & 2 else -5  # 速度をランダムで増減させる
             # 画面外出ないようにする
             if self.rect.left < 0:
                 self.vx = 10
@@ -468,34 +1304,41 @@ class Boss(pg.sprite.Sprite):
 class Weapon(pg.sprite.Sprite): 
     """
     武器の親クラス
+    速さや残留時間などの値は1フレームあたりで決めてある
     """
-    def __init__(self, bird: Bird, speed:int = 10):
+    def __init__(self, bird: Bird, speed:int = 30):
         super().__init__()
         self.bird = bird
         self.speed = speed
         self.damage = 1
-        self.life = 1000
+        self.life = 334
 
     def update(self):
         self.life -= 1
         if check_bound(self.rect) != (True, True):
             self.kill()
 
-class NormalWeapon(Weapon):
+class NormalWeapon(Pooled, Weapon):
     """
     通常弾に関するクラス
     """
-    img = pg.image.load(f"fig/beam.png")
-    small_image = pg.transform.scale(img, (img.get_width() // 2, img.get_height() // 2))
-    image = pg.transform.rotozoom(small_image, 90, 1)
-    def __init__(self, bird: Bird, beam_x: int = 0, speed: int = 10):
+    img = LazyAsset(lambda cls: pg.image.load(f"fig/beam.png"))  # カラーキーの画像は変換前のものから作る（変換後に回転すると背景が黒くなる）
+    small_image = LazyAsset(lambda cls: pg.transform.scale(cls.img, (cls.img.get_width() // 2, cls.img.get_height() // 2)), deps=("img",))
+    image = LazyAsset(lambda cls: pg.transform.rotozoom(cls.small_image, 90, 1), deps=("small_image",))
+    def __init__(self, bird: Bird, beam_x: int = 0, speed: int = 30):
+        super().__init__(bird, speed)
+        self.reset(bird, beam_x, speed)
+
+    def reset(self, bird: Bird, beam_x: int = 0, speed: int = 30):
         """
         武器画像Surfaceを生成する
         引数1 bird：武器を発射する飛行機
         引数2 ビームのX位置のオフセット
         引数3 ビームのスピード
         """
-        super().__init__(bird, speed)
+        self.bird = bird
+        self.speed = speed
+        self.life = 334
         self.rect = __class__.image.get_rect()
         self.rect.centerx = bird.rect.centerx + beam_x
         self.rect.bottom = bird.rect.top
@@ -510,29 +1353,15 @@ class PenetWeapon(NormalWeapon):
     """
     敵と衝突しても消えない弾に関するクラス
     """
-    def __init__(self, bird: Bird, beam_x: int = 0, speed: int = 10):
-        """
-        武器画像Surfaceを生成する
-        引数1 bird：武器を発射する飛行機
-        引数2 ビームのX位置のオフセット
-        引数3 ビームのスピード
-        """
-        super().__init__(bird, beam_x, speed)
-        self.image = pg.transform.laplacian(self.image)  # 区別をつける
-  
-    def update(self):
-        """
-        武器を上方向に移動させる
-        """
-        super().update()
+    image = LazyAsset(lambda cls: pg.transform.laplacian(NormalWeapon.image), deps=("NormalWeapon.image",))  # 区別をつける
 
 class SatelliteWeapon(Weapon):
     """
     飛行機の周りを周回する衛星に関するクラス
     """
-    img = pg.image.load(f"fig/satellite_shield.png")
-    image = pg.transform.rotozoom(img, 0, 0.05)
-    def __init__(self, bird: Bird, radius: int = 200, angle : int = 0, angular_speed: float = 0.05):
+    img = LazyAsset(lambda cls: assets.image(f"fig/satellite_shield.png"))
+    image = LazyAsset(lambda cls: pg.transform.rotozoom(cls.img, 0, 0.05), deps=("img",))
+    def __init__(self, bird: Bird, radius: int = 200, angle : int = 0, angular_speed: float = 0.15):
         """
         武器画像Surfaceを生成する
         引数1 bird：武器を発射する飛行機
@@ -559,51 +1388,55 @@ class SatelliteWeapon(Weapon):
 
 class ShootingSatelliteWeapon(SatelliteWeapon):
     bullets = pg.sprite.Group()
-    img = pg.image.load(f"fig/shootingsatellite.png")
-    image = pg.transform.rotozoom(img, 0, 0.5)
-    def __init__(self, bird: Bird, radius: int = 200, angle: int = 0, angular_speed: float = 0.05, shoot_cooldown: int = 50):
+    img = LazyAsset(lambda cls: assets.image(f"fig/shootingsatellite.png"))
+    image = LazyAsset(lambda cls: pg.transform.rotozoom(cls.img, 0, 0.5), deps=("img",))
+    def __init__(self, bird: Bird, radius: int = 200, angle: int = 0, angular_speed: float = 0.15, shoot_cooldown: int = 17):
         super().__init__(bird, radius, angle, angular_speed)
         self.shoot_cooldown = shoot_cooldown  # 発射間隔（フレーム数）
         self.shoot_timer = 0
 
     def update(self):
         """
-        武器を周回させると弾の発射
+        武器を周回させると弾の発射（弾はbulletsとしてGameが1フレームに1回更新する）
         """
         # 衛星の位置を更新
         super().update()
 
-        # 弾の発射と管理
+        # 弾の発射
         self.shoot_timer += 1
         if self.shoot_timer >= self.shoot_cooldown:
             self.shoot_timer = 0
-            # 新しい弾を生成
-            bullet = NormalWeapon(self.bird, 0, 1)
+            # 新しい弾を生成（速さは以前の衛星3つ分の更新回数に合わせる）
+            bullet = SatelliteBullet.spawn(self.bird, 0, 9)
             bullet.rect.center = self.rect.center
             ShootingSatelliteWeapon.bullets.add(bullet)
-        # 弾の更新
-        self.bullets.update()
 
 
-class SlashWeapon(Weapon):
+class SatelliteBullet(NormalWeapon):
     """
-    斬撃に関するクラス
+    衛星から発射される弾に関するクラス
     """
-    img = pg.image.load(f"fig/slash_effect.png")
-    image = pg.transform.flip(img, True, False)
-    def __init__(self, bird: Bird, hp: int = 10):
+
+
+class SlashWeapon(Weapon):
+    """
+    斬撃に関するクラス
+    """
+    img = LazyAsset(lambda cls: assets.image(f"fig/slash_effect.png"))
+    image = LazyAsset(lambda cls: pg.transform.flip(cls.img, True, False), deps=("img",))
+    def __init__(self, bird: Bird, hp: int = 4):
         """
         武器画像Surfaceを生成する
         引数1 bird：武器を発射する飛行機
-        引数2 斬撃の残留時間
+        引数2 斬撃の残留時間（当たり判定を受けるフレーム数）
         """
         super().__init__(bird)
         self.vx, self.vy = bird.dire
         angle = math.degrees(math.atan2(-self.vy, self.vx))
         self.vx = math.cos(math.radians(angle))
         self.vy = -math.sin(math.radians(angle))
-        self.image = pg.transform.smoothscale(__class__.image, (200, 50))
-        self.image = pg.transform.rotate(self.image, angle)
+        self.image = transforms.smoothscale(__class__.image, (200, 50))
+        self.image = transforms.rotate(self.image, angle)
         self.rect = self.image.get_rect()
         self.rect.centery = bird.rect.centery+bird.rect.height*self.vy
         self.rect.centerx = bird.rect.centerx+bird.rect.width*self.vx
@@ -611,19 +1444,20 @@ class SlashWeapon(Weapon):
     
     def update(self):
         """
-        斬撃の残留管理
+        斬撃の残留管理（hpフレームの間，衝突判定を受けてから消える）
         """
-        self.hp -= 1
         if self.hp <= 0:
             self.kill()
+            return
+        self.hp -= 1
 
 class BoomerangWeapon(Weapon):
     """
     ブーメランに関するクラス
     """
-    img = pg.image.load(f"fig/boomerang.png")
-    original_image = pg.transform.rotozoom(img, 0, 0.05)
-    def __init__(self, bird: Bird, speed: int = 5, max_distance: int = 300, rotation_speed: int = 10):
+    img = LazyAsset(lambda cls: assets.image(f"fig/boomerang.png"))
+    original_image = LazyAsset(lambda cls: pg.transform.rotozoom(cls.img, 0, 0.05), deps=("img",))
+    def __init__(self, bird: Bird, speed: int = 15, max_distance: int = 300, rotation_speed: int = 30):
         """
         武器画像Surfaceを生成する
         引数1 bird：武器を発射する飛行機
@@ -647,7 +1481,8 @@ class BoomerangWeapon(Weapon):
         """
         # ブーメランを回転させる
         self.angle = (self.angle + self.rotation_speed) % 360
-        self.image = pg.transform.rotate(self.original_image, self.angle)
+        frames = transforms.atlas(self.original_image, self.rotation_speed)
+        self.image = frames[round(self.angle * len(frames) / 360) % len(frames)]
         self.rect = self.image.get_rect(center=self.rect.center)
 
         if not self.returning:
@@ -669,13 +1504,128 @@ class BoomerangWeapon(Weapon):
             if self.rect.colliderect(self.bird.rect):
                 self.kill()
     
+class HomingWeapon(Weapon):
+    """
+    最も近い敵機かボスを追いかける弾（ハト）に関するクラス
+    狙う相手はGameが毎フレームまとめて選び直してtargetに入れる
+    """
+    image = LazyAsset(lambda cls: pg.transform.rotozoom(assets.image(f"fig/hato.png"), 0, 0.03))
+    def __init__(self, bird: Bird, heading: float = 90, speed: int = 12, turn: float = 0.24, life: int = 150):
+        """
+        武器画像Surfaceを生成する
+        引数1 bird：武器を発射する飛行機
+        引数2 最初に進む向き（度，90で真上）
+        引数3 ホーミング弾のスピード
+        引数4 1フレームに曲がれる角度（ラジアン）
+        引数5 ホーミング弾の寿命（フレーム数）
+        """
+        super().__init__(bird, speed)
+        self.rect = __class__.image.get_rect(center=bird.rect.midtop)
+        self.x, self.y = self.rect.center  # 小数の位置
+        self.heading = math.radians(heading)
+        self.turn = turn
+        self.life = life
+        self.target = None  # 追いかけるスプライト
+
+    def update(self):
+        """
+        狙う相手の方へ最大turnだけ向きを変えて進む．相手がいなければまっすぐ進む
+        """
+        if self.target is not None and self.target.alive():
+            tx, ty = self.target.rect.center
+            diff = math.atan2(self.y - ty, tx - self.x) - self.heading
+            diff = (diff + math.pi) % (2 * math.pi) - math.pi  # -π～πに収める
+            self.heading += max(-self.turn, min(self.turn, diff))
+        self.x += math.cos(self.heading) * self.speed
+        self.y -= math.sin(self.heading) * self.speed
+        self.rect.center = (round(self.x), round(self.y))
+        super().update()
+        if self.life <= 0:
+            self.kill()
+
+
+class WeaponGroup(pg.sprite.Group):
+    """
+    飛行機の武器のグループに関するクラス
+    武器のクラスごとの部分グループも持つので，種類ごとの数や武器を全体を走査せずに取り出せる
+    """
+    def __init__(self, *sprites):
+        self.kinds = {}  # 武器のクラス → そのクラスの武器（dictを追加順の集合として使う）
+        super().__init__(*sprites)
+
+    def add_internal(self, sprite, layer=None):
+        super().add_internal(sprite, layer)
+        self.kinds.setdefault(type(sprite), {})[sprite] = None
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.kinds[type(sprite)].pop(sprite, None)
+
+    def count(self, cls: type) -> int:
+        """
+        clsの武器（サブクラスを含む）の数
+        """
+        return sum(len(members) for kind, members in self.kinds.items() if issubclass(kind, cls))
+
+    def of(self, cls: type) -> list[pg.sprite.Sprite]:
+        """
+        clsの武器（サブクラスを含む）のリスト
+        """
+        return [sprite for kind, members in self.kinds.items() if issubclass(kind, cls) for sprite in members]
+
+
+class TimerWheel:
+    """
+    タイマーを期限のフレームのスロットに入れておき，期限が来たものだけを取り出すクラス（タイマーホイール）
+    1フレーム進めるときはそのフレームのスロットだけを見るので，タイマーの数や待ち時間によらない
+    スロット数より先の期限も入れられる（周回遅れのものはスロットに残る）
+    """
+    def __init__(self, size: int = 128):
+        """
+        引数 size：スロット数
+        """
+        self.slots = [[] for _ in range(size)]
+        self.pending = {}  # キー → 期限のフレーム（入れ直したら古い方は無視する）
+        self.now = 0
+
+    def schedule(self, key, delay: int):
+        """
+        keyの期限をdelayフレーム後にする（すでに入っていれば入れ直す）
+        """
+        due = self.now + max(delay, 1)
+        self.pending[key] = due
+        self.slots[due % len(self.slots)].append((due, key))
+
+    def cancel(self, key):
+        self.pending.pop(key, None)
+
+    def advance(self) -> list:
+        """
+        1フレーム進め，期限が来たキーを返す（返したキーは取り除かれる）
+        """
+        self.now += 1
+        slot = self.slots[self.now % len(self.slots)]
+        if not slot:
+            return []
+        due = []
+        later = []
+        for entry in slot:
+            t, key = entry
+            if t != self.now:
+                later.append(entry)
+            elif self.pending.get(key) == t:
+                del self.pending[key]
+                due.append(key)
+        slot[:] = later
+        return due
+
+
 class GetItem(pg.sprite.Sprite):
     """
     アイテムに関するクラス
     """
-    pg.font.init()
-    font = pg.font.SysFont("meiryo", 10)
-    def __init__(self, img_name: str, downsize: int, angle: int, xy: tuple, item_name: str, item_text: str = "未割当"):
+    font = LazyAsset(lambda cls: font_paths.font("meiryo", 10))
+    def __init__(self, img_name: str, downsize: int, angle: int, xy: tuple, item_name: str, item_text: str = "未割当", rnd: int | None = None):
         """
         アイテム画像Surfaceを生成する
         引数1 アイテムの画像の保存場所と名前
@@ -683,11 +1633,11 @@ class GetItem(pg.sprite.Sprite):
         引数3 アイテムの角度
         引数4 アイテムの生成位置
         引数5 アイテムの名前
+        引数6 アイテムの説明
+        引数7 rnd：画像を先読みしたラウンド（RoundAssetsから取り出す）
         """
         super().__init__()
-        img = pg.image.load(img_name)
-        small_image = self.scale_image(img, downsize)
-        self.small_image = pg.transform.rotozoom(small_image, angle, 1)
+        self.small_image = self.item_image(img_name, downsize, angle, rnd)
         self.rect = self.small_image.get_rect()
         self.rect.center = xy
         self.item_name = item_name
@@ -698,7 +1648,7 @@ class GetItem(pg.sprite.Sprite):
         max_width = 0
         total_height = 0
         for line in self.text_lines:
-            text_surf = self.font.render(line, True, (255, 255, 255))
+            text_surf = text_cache.render(self.font, line, True, (255, 255, 255))
             self.text_surfs.append(text_surf)
             max_width = max(max_width, text_surf.get_width())
             total_height += text_surf.get_height()
@@ -711,7 +1661,33 @@ class GetItem(pg.sprite.Sprite):
         self.text_rect = self.text_area.get_rect()
         self.text_rect.midtop = (self.rect.centerx, self.rect.bottom + 5)
 
-    def scale_image(self, image: pg.Surface, size: int):
+    @staticmethod
+    def pack_key(img_name: str, downsize: int, angle: int) -> str:
+        """
+        AssetPackでのアイテム画像のキー
+        """
+        return f"item:{img_name}:{downsize}:{angle}"
+
+    @classmethod
+    def packed(cls, img_name: str, downsize: int, angle: int) -> bool:
+        """
+        アイテム画像がAssetPackにあるか
+        """
+        return asset_pack.contains(cls.pack_key(img_name, downsize, angle), cls.fingerprint)
+
+    @classmethod
+    def item_image(cls, img_name: str, downsize: int, angle: int, rnd: int | None = None) -> pg.Surface:
+        """
+        元画像を正方形に収めて回転したアイテム画像を返す（AssetPackにあればそれを使う）
+        """
+        surf = asset_pack.get(cls.pack_key(img_name, downsize, angle), cls.fingerprint)
+        if surf is None:
+            img = assets.image(img_name) if rnd is None else round_assets.image(img_name, rnd)
+            surf = pg.transform.rotozoom(cls.scale_image(img, downsize), angle, 1)
+        return surf
+
+    @staticmethod
+    def scale_image(image: pg.Surface, size: int):
         """
         アスペクト比を保ちながら画像を指定サイズの正方形内に収める
         """
@@ -736,366 +1712,1771 @@ class GetItem(pg.sprite.Sprite):
         square_surface.blit(scaled_image, (x, y))
         
         return square_surface
-    def update(self, screen: pg.Surface):
+
+    fingerprint = AssetPack.fingerprint(item_image.__func__, scale_image.__func__)  # アイテム画像を作る処理の指紋
+
+    def update(self):
         """
-        画像の描画
+        アイテムを画面下部まで移動させる
         """
         if self.text_rect.bottom <= HEIGHT-100:
              self.text_rect.move_ip(0, 5)
              self.rect.move_ip(0, 5)
-        screen.blit(self.text_area, self.text_rect)
-        screen.blit(self.small_image, self.rect)
 
 class Life:
     """
     残機を表示するクラス
     """
     def __init__(self, life):
-        img = pg.image.load("fig/hikoki.png")
+        img = assets.image("fig/hikoki.png")
         self.img = pg.transform.scale(img, (50, 50))
         self.img_rect = self.img.get_rect()
         self.img_rect.center = (WIDTH-90, HEIGHT-50)
-        self.font = pg.font.Font(None, 50)
+        self.font = text_cache.font(None, 50)
         self.color = (255, 0, 0)
-        self.text = self.font.render(f"×{life}", 0, self.color)
+        self.text = self.render(life)
         self.text_rect = self.text.get_rect()
         self.text_rect.center = WIDTH-50, HEIGHT-50
     """
     残機を描画
     """
-    def update(self, screen: pg.Surface, life: int):
-        self.image = self.font.render(f"×{life}", 0, self.color)
-        screen.blit(self.img, self.img_rect)
-        screen.blit(self.image, self.text_rect)
+    def render(self, life: int) -> pg.Surface:
+        """
+        残機の文字画像を返す
+        """
+        self.image = text_cache.render(self.font, f"×{life}", 0, self.color)
+        return self.image
 
 
         
 
 
-def main():
-    bosshp = 100
-    pg.display.set_caption("真！飛行機無双")
-    screen = pg.display.set_mode((WIDTH, HEIGHT))
-    bg_img = pg.image.load(f"fig/pg_bg.jpg")
-    score = Score()
-
-    bird = Bird(3, (WIDTH//2, HEIGHT-100))
-    bombs = pg.sprite.Group()
-    bombs2 = pg.sprite.Group()
-    beams = pg.sprite.Group()
-    exps = pg.sprite.Group()
-    emys = pg.sprite.Group()
-    shields = pg.sprite.Group()
-    gvys = pg.sprite.Group()
-
-    round_manager = Round()
-    weapons = pg.sprite.Group()
-    items = pg.sprite.Group()    
-    bosses = pg.sprite.Group()
-    life = Life(bird.hp)
-    
+SPAWN_RATES = [(250, 1), (200, 2), (170, 4), (80, 5)]  # ラウンド0～3の敵機の出現間隔（フレーム）と数
+WEAPON_COOLDOWNS = {"bullet": 14, "satellite": 70, "slash": 20, "boomerang": 20, "homing": 40}  # 武器の種類ごとの発射間隔（この順に発射する）
 
-    tmr = 0
-    num_barriers = 3
-    angle = 360 / num_barriers
-    weapon_cooldown ={"bullet":14, "satellite":70, "slash":20, "boomerang":20}
-    weapon_timer = {"bullet":14, "satellite":70, "slash":20, "boomerang":20}
-    weapon_dict = {"weapon_mode":0, "satellite":0, "slash":0, "boomerang":0}
-    clock = pg.time.Clock()
+# プールするスプライトのクラスと，保持する空きスプライトの最大数
+POOL_CAPS = {NormalWeapon: 256, PenetWeapon: 256, SatelliteBullet: 128, Bomb: 1024, Explosion: 256}
+pools = {cls: SpritePool(cls, cap) for cls, cap in POOL_CAPS.items()}
 
-    show_title_screen(screen)
-    title_screen = True
-    while title_screen:
-        for event in pg.event.get():
-            if event.type == pg.QUIT:
-                return 0
-            if event.type == pg.KEYDOWN and event.key == pg.K_s:
-                title_screen = False
 
-    boss_count = 0
-    while True:
-        key_lst = pg.key.get_pressed()
-        for event in pg.event.get():
+# 武器の種類×対象グループ → (武器を消すか, 対象を消すか, スコア, 効果)
+# 効果 ("explosion", n)：寿命nの爆発エフェクト，("chain", n)：周りを巻き込む爆発，("damage", n)：ボスのHPをn減らす
+COLLISION_RULES = {
+    (NormalWeapon, "emys"): (True, True, 10, ("explosion", 100)),
+    (NormalWeapon, "bombs"): (False, True, 1, ("explosion", 50)),
+    (NormalWeapon, "bosses"): (True, False, 0, ("damage", 1)),
+    (NormalWeapon, "bombs2"): (True, False, 0, None),  # 消せないボムとぶつかったらビームのみを消す
+
+    (PenetWeapon, "emys"): (False, True, 10, ("explosion", 100)),
+    (PenetWeapon, "bombs"): (False, True, 1, ("explosion", 50)),
+    (PenetWeapon, "bosses"): (True, False, 0, ("damage", 1)),
+    (PenetWeapon, "bombs2"): (True, False, 0, None),
+
+    (SatelliteWeapon, "emys"): (False, True, 10, ("explosion", 100)),
+    (SatelliteWeapon, "bombs"): (False, True, 1, ("explosion", 50)),
+    (SatelliteWeapon, "bosses"): (False, False, 0, ("damage", 1)),
+    (SatelliteWeapon, "bombs2"): (True, True, 0, None),
+
+    (ShootingSatelliteWeapon, "emys"): (True, True, 10, ("explosion", 100)),
+    (ShootingSatelliteWeapon, "bombs"): (False, True, 1, ("explosion", 50)),
+    (ShootingSatelliteWeapon, "bosses"): (False, False, 0, ("damage", 1)),
+    (ShootingSatelliteWeapon, "bombs2"): (True, False, 0, None),
+
+    (SatelliteBullet, "emys"): (True, True, 10, ("explosion", 100)),
+    (SatelliteBullet, "bombs"): (True, True, 1, ("explosion", 50)),
+    (SatelliteBullet, "bosses"): (True, False, 0, ("damage", 1)),
+    (SatelliteBullet, "bombs2"): (True, False, 0, None),
+
+    (SlashWeapon, "emys"): (False, True, 10, ("explosion", 100)),
+    (SlashWeapon, "bombs"): (False, True, 1, ("explosion", 50)),
+    (SlashWeapon, "bosses"): (False, False, 0, ("damage", 1)),
+
+    (BoomerangWeapon, "emys"): (False, True, 10, ("explosion", 100)),
+    (BoomerangWeapon, "bombs"): (False, True, 1, ("explosion", 50)),
+    (BoomerangWeapon, "bosses"): (False, False, 0, ("damage", 1)),
+    (BoomerangWeapon, "bombs2"): (True, False, 0, None),
+
+    (HomingWeapon, "emys"): (True, True, 10, ("explosion", 100)),  # 爆弾は追いかけないので通り抜ける
+    (HomingWeapon, "bosses"): (True, False, 0, ("damage", 1)),
+    (HomingWeapon, "bombs2"): (True, False, 0, None),
+
+    ("shield", "bombs"): (True, True, 0, ("explosion", 50)),
+    ("gravity", "emys"): (False, True, 10, ("chain", 100)),
+    ("gravity", "bombs"): (False, True, 1, ("chain", 50)),
+}
+
+
+class BulletEngine:
+    """
+    敵の弾（Bombのmode 0～3）の位置・速度・経過フレーム数などをNumPy配列でまとめて持ち，
+    移動・壁での反射・寿命・画面外の判定を全弾まとめて行うクラス
+    スプライトに対応しない弾（負荷試験用など）はdraw()で描画する
+    """
+    lifetime = 300  # 弾が消えるまでのフレーム数
+
+    def __init__(self, capacity: int = 256):
+        """
+        引数 capacity：最初に確保する弾の数（足りなくなったら倍に増やす）
+        """
+        self.sprites = [None] * capacity
+        self.images = [None] * capacity
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.w = np.zeros(capacity)
+        self.h = np.zeros(capacity)
+        self.vx = np.zeros(capacity)
+        self.vy = np.zeros(capacity)
+        self.speed = np.zeros(capacity)
+        self.age = np.zeros(capacity, dtype=np.int32)
+        self.mode = np.zeros(capacity, dtype=np.int8)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.free = list(range(capacity - 1, -1, -1))
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.active))
+
+    def grow(self):
+        """
+        配列の大きさを倍にする
+        """
+        n = len(self.active)
+        for name in ("x", "y", "w", "h", "vx", "vy", "speed", "age", "mode", "active"):
+            old = getattr(self, name)
+            new = np.zeros(2 * n, dtype=old.dtype)
+            new[:n] = old
+            setattr(self, name, new)
+        self.sprites.extend([None] * n)
+        self.images.extend([None] * n)
+        self.free.extend(range(2 * n - 1, n - 1, -1))
+
+    def spawn(self, rect: pg.Rect, vx: float, vy: float, speed: float, mode: int, image: pg.Surface | None = None, sprite: "Bomb|None" = None) -> int:
+        """
+        弾を1つ登録し，その番号を返す
+        """
+        if not self.free:
+            self.grow()
+        i = self.free.pop()
+        self.x[i], self.y[i], self.w[i], self.h[i] = rect.left, rect.top, rect.width, rect.height
+        self.vx[i], self.vy[i], self.speed[i] = vx, vy, speed
+        self.age[i] = 0
+        self.mode[i] = mode
+        self.active[i] = True
+        self.sprites[i] = sprite
+        self.images[i] = image
+        return i
+
+    def add(self, bomb: "Bomb"):
+        """
+        Bombスプライトを登録する．以後の移動はBomb.updateではなくこのクラスが行う
+        """
+        bomb.engine = self
+        bomb.slot = self.spawn(bomb.rect, bomb.vx, bomb.vy, bomb.speed, bomb.mode, sprite=bomb)
+        self.age[bomb.slot] = bomb.count
+
+    def remove(self, i: int):
+        """
+        i番の弾を取り除く
+        """
+        self.active[i] = False
+        bomb = self.sprites[i]
+        if bomb is not None:
+            bomb.slot = None
+        self.sprites[i] = None
+        self.images[i] = None
+        self.free.append(i)
+
+    def clear(self):
+        for i in np.flatnonzero(self.active).tolist():
+            self.remove(i)
+
+    def update(self):
+        """
+        全弾を1フレーム分動かし，画面の上下から出た弾と寿命の尽きた弾を消す
+        移動量はBomb.updateのmove_ipと同じく整数に切り捨てる
+        """
+        a = self.active
+        x, y = self.x, self.y
+        bounce = a & (self.mode != 0)  # mode 0以外は左右の壁で跳ね返る
+        left = bounce & (x < 0)
+        x[left] = 0
+        self.vx[left] *= -1
+        right = bounce & (x + self.w > WIDTH)
+        x[right] = WIDTH - self.w[right]
+        self.vx[right] *= -1
+        x += np.trunc(self.speed * self.vx) * a
+        y += np.trunc(self.speed * self.vy) * a
+        self.age += a
+        dead = a & ((y < 0) | (HEIGHT < y + self.h) | (self.age >= __class__.lifetime))
+        for i in np.flatnonzero(dead).tolist():
+            bomb = self.sprites[i]
+            if bomb is not None:
+                bomb.kill()
+            else:
+                self.remove(i)
+        # 生き残ったスプライトの位置を反映する
+        sprites = self.sprites
+        live = np.flatnonzero(self.active)
+        for i, left, top in zip(live.tolist(), x[live].tolist(), y[live].tolist()):
+            bomb = sprites[i]
+            if bomb is not None:
+                bomb.rect.topleft = left, top
+
+    def collide(self, rect: pg.Rect, nohit: bool = False, sprite: pg.sprite.Sprite | None = None) -> list[int]:
+        """
+        rectと重なる弾の番号をまとめて求める
+        引数1 rect：判定する矩形（飛行機など）
+        引数2 nohit：Trueなら消せない弾（mode 2）だけ，Falseならそれ以外の弾だけを対象にする
+        引数3 sprite：指定するとSpatialHash.preciseのときに矩形で絞り込んだ弾をさらに見た目どおりに判定する
+        """
+        mask = self.active & ((self.mode == 2) == nohit)
+        mask &= (self.x < rect.right) & (rect.left < self.x + self.w)
+        mask &= (self.y < rect.bottom) & (rect.top < self.y + self.h)
+        hits = np.flatnonzero(mask).tolist()
+        if sprite is not None and SpatialHash.precise:
+            hits = [i for i in hits if self.touches(i, sprite)]
+        return hits
+
+    def touches(self, i: int, sprite: pg.sprite.Sprite) -> bool:
+        """
+        i番の弾がspriteに見た目どおりに重なるか
+        """
+        bomb = self.sprites[i]
+        if bomb is not None:
+            return masks.collide(sprite, bomb)
+        image = self.images[i]
+        if image is None:
+            return True
+        rect = image.get_rect(topleft=(int(self.x[i]), int(self.y[i])))
+        return rect.colliderect(sprite.rect) and masks.overlap(sprite.image, sprite.rect, image, rect)
+
+    def kill(self, indices: list[int]):
+        """
+        番号で指定した弾を消す
+        """
+        for i in indices:
+            bomb = self.sprites[i]
+            if bomb is not None:
+                bomb.kill()
+            else:
+                self.remove(i)
+
+    def blit_sequence(self) -> list[tuple[pg.Surface, tuple[float, float]]]:
+        """
+        スプライトに対応しない弾の(画像, 位置)のリスト
+        """
+        images = self.images
+        live = np.flatnonzero(self.active)
+        pairs = zip(live.tolist(), self.x[live].tolist(), self.y[live].tolist())
+        return [(images[i], (left, top)) for i, left, top in pairs if images[i] is not None]
+
+
+class Hud:
+    """
+    スコアと残機を1枚のSurfaceにまとめて描画するクラス
+    値が変わったときだけ描き直し，それ以外は同じSurfaceを1回blitする
+    """
+    def __init__(self, score: Score, life: Life):
+        self.score = score
+        self.life = life
+        self.shown = None  # 描画済みの(スコア, 残機)
+        self.image = None
+        self.rect = None
+
+    def render(self, hp: int) -> tuple[pg.Surface, pg.Rect]:
+        """
+        HUDの(画像, 位置)を返す（値が変わったときだけ描き直す）
+        引数 hp：飛行機の残機
+        """
+        if self.shown != (self.score.value, hp):
+            self.shown = (self.score.value, hp)
+            score_img = self.score.render()
+            life_img = self.life.render(hp)
+            parts = [
+                (score_img, self.score.rect.topleft),
+                (self.life.img, self.life.img_rect.topleft),
+                (life_img, self.life.text_rect.topleft),
+            ]
+            rect = pg.Rect(parts[0][1], parts[0][0].get_size())
+            rect.unionall_ip([pg.Rect(pos, img.get_size()) for img, pos in parts[1:]])
+            self.image = pg.Surface(rect.size, pg.SRCALPHA)
+            for img, (x, y) in parts:
+                self.image.blit(img, (x - rect.left, y - rect.top))
+            if pg.display.get_surface() is not None:
+                self.image = self.image.convert_alpha()
+            self.rect = rect
+        return self.image, self.rect
+
+
+class SpatialHash:
+    """
+    一様グリッドによる当たり判定の絞り込み（ブロードフェーズ）に関するクラス
+    矩形の判定はRect.collidelistallでまとめて行い，スプライトがmin_sprites以上のグループだけマスに分けて調べる範囲を絞る
+    毎フレーム1回build()で登録し直し，groupcollide()とspritecollide()は
+    pg.sprite.groupcollide，pg.sprite.spritecollideと同じ結果を返す
+    preciseのときは矩形で絞り込んだ後にmasks.collideで見た目どおりに重なるものだけを残す
+    """
+    check = False  # Trueのときpygameの総当たり判定と結果を照合する
+    precise = True  # Falseのときは矩形だけで判定する
+    min_sprites = 1024  # マスに分けるグループのスプライト数の下限（これより少なければまとめて調べる方が速い）
+
+    @classmethod
+    def collided(cls):
+        """
+        pg.sprite.spritecollideなどに渡す判定関数
+        """
+        return masks.collide if cls.precise else None
+
+    def __init__(self, cell: int = 64):
+        """
+        引数 cell：グリッド1マスの大きさ
+        """
+        self.cell = cell
+        self.cells = {}  # グループ → {マス: ([スプライト], [矩形])}（グループ内の順）
+        self.flat = {}  # グループ → ([スプライト], [矩形])（スプライトの少ないグループ）
+        self.order = {}  # グループ → {スプライト: グループ内の順番}
+
+    def keys(self, rect: pg.Rect):
+        """
+        rectが重なるマスを列挙する
+        """
+        c = self.cell
+        for x in range(rect.left // c, max(rect.left, rect.right - 1) // c + 1):
+            for y in range(rect.top // c, max(rect.top, rect.bottom - 1) // c + 1):
+                yield x, y
+
+    def build(self, *groups: pg.sprite.AbstractGroup):
+        """
+        グループ内の全スプライトを登録し直す
+        スプライトがmin_sprites未満のグループはマスに分けず，全部の矩形をまとめて調べる（その方が速い）
+        """
+        self.cells.clear()
+        self.flat.clear()
+        self.order.clear()
+        c = self.cell
+        for group in groups:
+            sprites = group.sprites()
+            if len(sprites) < __class__.min_sprites:
+                self.flat[group] = (sprites, [sprite.rect for sprite in sprites])
+                continue
+            cells = {}
+            order = {}
+            for n, sprite in enumerate(sprites):
+                order[sprite] = n
+                rect = sprite.rect
+                left, top, w, h = rect
+                for x in range(left // c, (left + max(w, 1) - 1) // c + 1):
+                    for y in range(top // c, (top + max(h, 1) - 1) // c + 1):
+                        cell = cells.get((x, y))
+                        if cell is None:
+                            cells[x, y] = ([sprite], [rect])
+                        else:
+                            cell[0].append(sprite)
+                            cell[1].append(rect)
+            self.cells[group] = cells
+            self.order[group] = order
+
+    def query(self, rect: pg.Rect, group: pg.sprite.AbstractGroup) -> list:
+        """
+        rectと重なるgroup内のスプライトをグループ内の順番で返す
+        矩形の判定はRect.collidelistallでまとめて行う．各マスの中もグループ内の順に並んでいるので，
+        並べ直すのは複数のマスにまたがって2つ以上当たったときだけ
+        """
+        members = group.spritedict  # build()の後に消えたスプライトを除く
+        flat = self.flat.get(group)
+        if flat is not None:
+            sprites, rects = flat
+            return [sprites[i] for i in rect.collidelistall(rects) if sprites[i] in members]
+        cells = self.cells[group]
+        c = self.cell
+        x0, x1 = rect.left // c, max(rect.left, rect.right - 1) // c
+        y0, y1 = rect.top // c, max(rect.top, rect.bottom - 1) // c
+        if x0 == x1 and y0 == y1:
+            cell = cells.get((x0, y0))
+            if cell is None:
+                return []
+            sprites, rects = cell
+            return [sprites[i] for i in rect.collidelistall(rects) if sprites[i] in members]
+        hits = {}  # 複数のマスに登録されたスプライトを1つにまとめる
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                cell = cells.get((x, y))
+                if cell is None:
+                    continue
+                sprites, rects = cell
+                for i in rect.collidelistall(rects):
+                    hits[sprites[i]] = None
+        hits = [s for s in hits if s in members]
+        if len(hits) > 1:
+            hits.sort(key=self.order[group].__getitem__)
+        return hits
+
+    def spritecollide(self, sprite: pg.sprite.Sprite, group: pg.sprite.AbstractGroup, dokill: bool) -> list:
+        """
+        pg.sprite.spritecollideと同じ
+        """
+        if not group:
+            return []
+        if group not in self.cells and group not in self.flat:
+            return pg.sprite.spritecollide(sprite, group, dokill, self.collided())
+        hits = self.query(sprite.rect, group)
+        if __class__.precise:
+            hits = [s for s in hits if masks.collide(sprite, s)]
+        if __class__.check:
+            self.verify(hits, pg.sprite.spritecollide(sprite, group, False, self.collided()))
+        if dokill:
+            for s in hits:
+                s.kill()
+        return hits
+
+    def groupcollide(self, groupa: pg.sprite.AbstractGroup, groupb: pg.sprite.AbstractGroup, dokilla: bool, dokillb: bool) -> dict:
+        """
+        pg.sprite.groupcollideと同じ
+        """
+        if groupb not in self.cells and groupb not in self.flat:
+            return pg.sprite.groupcollide(groupa, groupb, dokilla, dokillb, self.collided())
+        pairs = {}
+        for a in groupa.sprites():
+            hits = self.query(a.rect, groupb)
+            if __class__.precise:
+                hits = [b for b in hits if masks.collide(a, b)]
+            if hits:
+                pairs[a] = hits
+        if __class__.check:
+            self.verify(pairs, pg.sprite.groupcollide(groupa, groupb, False, False, self.collided()))
+        crashed = {}
+        killed = set()
+        for a, hits in pairs.items():
+            if dokillb:
+                hits = [b for b in hits if b not in killed]
+                if not hits:
+                    continue
+                for b in hits:
+                    b.kill()
+                killed.update(hits)
+            crashed[a] = hits
+            if dokilla:
+                a.kill()
+        return crashed
+
+    @staticmethod
+    def verify(got, expected):
+        """
+        ブロードフェーズの結果が総当たり判定の結果と一致しなければ例外を送出する
+        """
+        if got != expected:
+            raise AssertionError(f"SpatialHash mismatch: {got!r} != {expected!r}")
+
+
+class TargetIndex:
+    """
+    スプライトの中心を一様グリッドに登録し，ある点に最も近いスプライトを探すクラス（ホーミング弾の狙い先）
+    毎フレーム1回build()で登録し直し，nearest_many()で複数の点についてまとめて探す
+    点のマスから1周ずつ外側へ調べ，残りのマスにいるスプライトが見つけたものより近くなりえなくなったらやめる
+    """
+    check = False  # Trueのとき総当たりで探した結果と照合する
+
+    def __init__(self, cell: int = 128):
+        """
+        引数 cell：グリッド1マスの大きさ
+        """
+        self.cell = cell
+        self.cells = {}  # マス → [(中心x, 中心y, 順番, スプライト)]
+        self.entries = []  # 登録した順の(中心x, 中心y, 順番, スプライト)（照合用）
+        self.bounds = None  # 登録したマスの範囲(左, 上, 右, 下)
+
+    def build(self, *groups: pg.sprite.AbstractGroup):
+        """
+        グループ内の全スプライトを登録し直す（距離が同じなら先に登録したものを返す）
+        """
+        c = self.cell
+        self.cells.clear()
+        self.entries = []
+        for group in groups:
+            for sprite in group:
+                x, y = sprite.rect.center
+                entry = (x, y, len(self.entries), sprite)
+                self.entries.append(entry)
+                self.cells.setdefault((x // c, y // c), []).append(entry)
+        if self.cells:
+            xs = [x for x, _ in self.cells]
+            ys = [y for _, y in self.cells]
+            self.bounds = (min(xs), min(ys), max(xs), max(ys))
+        else:
+            self.bounds = None
+
+    @staticmethod
+    def ring(cx: int, cy: int, r: int):
+        """
+        マス(cx, cy)からチェビシェフ距離でちょうどrのマスを列挙する
+        """
+        if r == 0:
+            yield cx, cy
+            return
+        for x in range(cx - r, cx + r + 1):
+            yield x, cy - r
+            yield x, cy + r
+        for y in range(cy - r + 1, cy + r):
+            yield cx - r, y
+            yield cx + r, y
+
+    def nearest(self, point: tuple[float, float]) -> pg.sprite.Sprite | None:
+        """
+        中心がpointに最も近いスプライトを返す（1つも登録していなければNone）
+        """
+        if self.bounds is None:
+            return None
+        c = self.cell
+        cells = self.cells
+        px, py = point
+        cx, cy = int(px // c), int(py // c)
+        left, top, right, bottom = self.bounds
+        reach = max(cx - left, right - cx, cy - top, bottom - cy)
+        best, best_d, best_n = None, math.inf, 0
+        for r in range(reach + 1):
+            for key in self.ring(cx, cy, r):
+                for x, y, n, sprite in cells.get(key, ()):
+                    d = (x - px) ** 2 + (y - py) ** 2
+                    if d < best_d or (d == best_d and n < best_n):
+                        best, best_d, best_n = sprite, d, n
+            if best_d < (r * c) ** 2:
+                break  # r周目より外のマスにいるスプライトはr*c以上離れている
+        if __class__.check:
+            SpatialHash.verify(best, self.nearest_brute(point))
+        return best
+
+    def nearest_many(self, points: list[tuple[float, float]]) -> list:
+        """
+        pointsのそれぞれについて最も近いスプライトを返す
+        """
+        return [self.nearest(point) for point in points]
+
+    def nearest_brute(self, point: tuple[float, float]) -> pg.sprite.Sprite | None:
+        """
+        nearest()を総当たりで求める（照合用）
+        """
+        px, py = point
+        best, best_d = None, math.inf
+        for x, y, _, sprite in self.entries:
+            d = (x - px) ** 2 + (y - py) ** 2
+            if d < best_d:
+                best, best_d = sprite, d
+        return best
+
+
+class DirtyScreen:
+    """
+    画面Surfaceの代わりに描画先として渡し，描画した矩形を記録するクラス
+    差分描画モードでは前フレームに描画した部分だけを背景で塗り直し，
+    変化した矩形だけをpg.display.updateに渡す
+    """
+    max_rects = 200  # これより矩形が多いフレームは画面全体を更新する
+
+    def __init__(self, screen: pg.Surface):
+        """
+        引数 screen：実際の画面Surface
+        """
+        self.screen = screen
+        self.background = None  # 前フレームの背景Surface
+        self.rects = []  # このフレームで描画した矩形
+        self.prev = []  # 前フレームで描画した矩形
+        self.full = True  # このフレームは画面全体を更新するか
+
+    def __getattr__(self, name: str):
+        return getattr(self.screen, name)
+
+    def blit(self, source: pg.Surface, dest, area=None, special_flags: int = 0) -> pg.Rect:
+        rect = self.screen.blit(source, dest, area, special_flags)
+        self.rects.append(rect)
+        return rect
+
+    def blits(self, blit_sequence, doreturn: bool = True):
+        rects = self.screen.blits(blit_sequence, True)
+        self.rects.extend(rects)
+        return rects if doreturn else None
+
+    def fill(self, color, rect=None, special_flags: int = 0) -> pg.Rect:
+        rect = self.screen.fill(color, rect, special_flags)
+        self.rects.append(rect)
+        return rect
+
+    def begin(self, background: pg.Surface | None) -> bool:
+        """
+        フレームの描画を始める
+        背景が前フレームと同じなら前フレームの描画部分だけを背景で塗り直す
+        引数 background：今フレームの背景（ラウンドのトランジション中はNone）
+        戻り値：画面全体を描き直す必要があればTrue
+        """
+        self.prev = self.rects
+        self.rects = []
+        self.full = background is None or background is not self.background
+        self.background = background
+        if not self.full:
+            for rect in self.prev:
+                self.screen.blit(background, rect, rect)
+        return self.full
+
+    def flip(self):
+        """
+        変化した部分だけを画面に反映する
+        """
+        if self.full or len(self.prev) + len(self.rects) > __class__.max_rects:
+            pg.display.update()
+        else:
+            pg.display.update(self.prev + self.rects)
+
+
+# 描画のレイヤー（小さいものから順に描く）．背景とF3のオーバーレイはレイヤーに入れず，その前後に描く
+LAYERS = {
+    "items": 0, "exps": 1, "bird": 2, "weapons": 3, "bullets": 4, "emys": 5, "bombs": 6, "bombs2": 7,
+    "bullet_engine": 8, "hud": 9, "gvys": 10, "shields": 11, "bosses": 12, "result": 13,
+}
+
+
+class RenderQueue:
+    """
+    1フレーム分の描画を(Surface, 位置, レイヤー)として集め，レイヤー順に並べて1回のblitsで描くクラス
+    描画順は追加した順ではなくレイヤーで決まる（同じレイヤーの中は追加した順）
+    pygame-ceのSurface.fblitsがあればそれを使う
+    """
+    def __init__(self):
+        self.layers = {}  # レイヤー → [(Surface, 位置)]
+        self.last = 0  # 前回のflushで描いた数
+
+    def add(self, surf: pg.Surface, pos, layer: int):
+        self.layers.setdefault(layer, []).append((surf, pos))
+
+    def extend(self, blit_sequence, layer: int):
+        self.layers.setdefault(layer, []).extend(blit_sequence)
+
+    def add_group(self, group: pg.sprite.AbstractGroup, layer: int, prev: dict | None = None, alpha: float = 1.0):
+        """
+        グループの全スプライトを追加する
+        引数1 group：スプライトのグループ
+        引数2 layer：レイヤー
+        引数3 prev：スプライト → 前フレームの位置（補間するとき）
+        引数4 alpha：前フレームから今フレームまでのどこに描くか
+        """
+        if alpha >= 1 or not prev:
+            self.extend([(sprite.image, sprite.rect) for sprite in group], layer)
+            return
+        seq = []
+        for sprite in group:
+            rect = sprite.rect
+            pos = prev.get(sprite)
+            if pos is not None:
+                rect = (pos[0] + (rect.x - pos[0]) * alpha, pos[1] + (rect.y - pos[1]) * alpha)
+            seq.append((sprite.image, rect))
+        self.extend(seq, layer)
+
+    def flush(self, screen: pg.Surface) -> int:
+        """
+        集めた描画をレイヤー順にscreenへ描いて空にする
+        戻り値：描いた数
+        """
+        seq = [entry for layer in sorted(self.layers) for entry in self.layers[layer]]
+        self.layers.clear()
+        if isinstance(screen, DirtyScreen):  # 描いた矩形を記録させる
+            screen.blits(seq, False)
+        elif hasattr(screen, "fblits"):
+            screen.fblits(seq)
+        else:
+            screen.blits(seq, False)
+        self.last = len(seq)
+        return self.last
+
+
+class FrameProfiler:
+    """
+    1フレーム内の処理ごとの時間を計測し，直近のフレームをリングバッファに残すクラス
+    処理の区切りでlap(名前)を呼ぶと，前の区切りからの時間がその名前で記録される
+    """
+    def __init__(self, enabled: bool = False, size: int = 300):
+        """
+        引数1 enabled：計測するか
+        引数2 size：残すフレーム数
+        """
+        self.enabled = enabled
+        self.frames = deque(maxlen=size)  # (開始時刻, 終了時刻, [(処理名, 開始, 終了)], {グループ名: 数})
+        self.laps = []
+        self.start = self.last = time.perf_counter()
+        self.show = False  # オーバーレイを表示するか
+        self.overlay = None
+        self.overlay_age = 0
+
+    def begin_frame(self):
+        """
+        フレームの計測を始める
+        """
+        if self.enabled:
+            self.laps = []
+            self.start = self.last = time.perf_counter()
+
+    def lap(self, name: str):
+        """
+        前の区切りからここまでの時間をnameとして記録する
+        """
+        if self.enabled:
+            now = time.perf_counter()
+            self.laps.append((name, self.last, now))
+            self.last = now
+
+    def end_frame(self, counts: dict[str, int]):
+        """
+        フレームの計測を終えてリングバッファに入れる
+        引数 counts：スプライトグループごとのスプライト数
+        """
+        if self.enabled:
+            self.frames.append((self.start, time.perf_counter(), self.laps, counts))
+
+    def toggle(self):
+        """
+        オーバーレイの表示を切り替える（表示するときは計測も始める）
+        """
+        self.show = not self.show
+        if self.show:
+            self.enabled = True
+
+    def summary(self) -> dict[str, float]:
+        """
+        リングバッファ内のフレームの処理ごとの平均時間（ミリ秒）を返す
+        """
+        total = {}
+        for _, _, laps, _ in self.frames:
+            for name, t0, t1 in laps:
+                total[name] = total.get(name, 0) + (t1 - t0)
+        n = max(len(self.frames), 1)
+        return {name: t * 1000 / n for name, t in total.items()}
+
+    def draw_overlay(self, screen: pg.Surface):
+        """
+        処理ごとの平均時間とスプライト数を画面左上に表示する（25フレームごとに更新）
+        """
+        if not self.show or not self.frames:
+            return
+        self.overlay_age -= 1
+        if self.overlay is None or self.overlay_age <= 0:
+            self.overlay_age = 25
+            start, end, _, counts = self.frames[-1]
+            summary = sorted(self.summary().items(), key=lambda item: -item[1])
+            lines = [f"frame {(end - start) * 1000:.2f} ms"]
+            lines += [f"{name}: {ms:.2f} ms" for name, ms in summary[:16]]
+            lines += [" ".join(f"{name}:{n}" for name, n in counts.items())]
+            font = text_cache.font(None, 18)
+            imgs = [font.render(line, True, (255, 255, 0)) for line in lines]
+            self.overlay = pg.Surface((max(img.get_width() for img in imgs) + 8, 16 * len(imgs) + 8), pg.SRCALPHA)
+            self.overlay.fill((0, 0, 0, 160))
+            for i, img in enumerate(imgs):
+                self.overlay.blit(img, (4, 4 + 16 * i))
+        screen.blit(self.overlay, (0, 0))
+
+    def export_chrome_trace(self, path: str):
+        """
+        リングバッファ内のフレームをChrome/Perfettoで開けるトレース形式（JSON）で書き出す
+        """
+        trace = []
+        for start, end, laps, counts in self.frames:
+            trace.append({"name": "frame", "ph": "X", "ts": start * 1e6, "dur": (end - start) * 1e6, "pid": 0, "tid": 0})
+            for name, t0, t1 in laps:
+                trace.append({"name": name, "ph": "X", "ts": t0 * 1e6, "dur": (t1 - t0) * 1e6, "pid": 0, "tid": 0})
+            trace.append({"name": "sprites", "ph": "C", "ts": start * 1e6, "pid": 0, "args": counts})
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+
+
+class KeyState:
+    """
+    pg.key.get_pressed()の代わりに使う押下キーの集合
+    引数 keys：押されているキー定数の集合
+    """
+    def __init__(self, keys=()):
+        self.keys = frozenset(keys)
+
+    def __getitem__(self, key: int) -> bool:
+        return key in self.keys
+
+
+class ScriptedInput:
+    """
+    ヘッドレス実行用の入力源
+    スクリプトを省略すると何も押さない（アイドル）入力になる
+    """
+    def __init__(self, script: list[tuple[int, KeyState]] | None = None):
+        """
+        引数 script：（フレーム番号，押下キー）のリスト，次の指定まで押しっぱなしになる
+        """
+        self.script = sorted(script or [], key=lambda s: s[0])
+        self.pos = 0
+        self.current = KeyState()
+
+    def get_pressed(self, tmr: int) -> KeyState:
+        """
+        フレームtmrで押されているキーを返す
+        """
+        while self.pos < len(self.script) and self.script[self.pos][0] <= tmr:
+            self.current = self.script[self.pos][1]
+            self.pos += 1
+        return self.current
+
+    @classmethod
+    def from_file(cls, path: str) -> "ScriptedInput":
+        """
+        1行に「フレーム番号 キー名,キー名」と書かれたファイルから入力を読み込む
+        キー名はpg.K_の後ろの部分（UP, LSHIFTなど），キー名なしで全キーを離す
+        """
+        script = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.split("#")[0].strip()
+                if not line:
+                    continue
+                tick, _, names = line.partition(" ")
+                keys = [getattr(pg, f"K_{name.strip()}") for name in names.split(",") if name.strip()]
+                script.append((int(tick), KeyState(keys)))
+        return cls(script)
+
+
+class RandomInput:
+    """
+    一定フレームごとにランダムな方向キーを押すヘッドレス実行用の入力源
+    """
+    def __init__(self, seed: int | None = None, hold: int = 10):
+        """
+        引数1 seed：入力用乱数のシード
+        引数2 hold：同じキーを押し続けるフレーム数
+        """
+        self.rng = random.Random(seed)
+        self.hold = hold
+        self.current = KeyState()
+
+    def get_pressed(self, tmr: int) -> KeyState:
+        if tmr % self.hold == 0:
+            keys = [k for k in Bird.delta if self.rng.random() < 0.3]
+            if self.rng.random() < 0.2:
+                keys.append(pg.K_LSHIFT)
+            self.current = KeyState(keys)
+        return self.current
+
+
+class InputRecording:
+    """
+    フレームごとの入力を1バイトずつ記録し，ファイルへの保存と再生を行うクラス
+    ビット0～4は押されているキー（keysの順），ビット5はそのフレームにスペースキーが押されたか
+    ファイルは1行目に開始条件と終了時のチェックサムのJSON，以降にzlibで圧縮した入力を書く
+    """
+    keys = (pg.K_UP, pg.K_DOWN, pg.K_LEFT, pg.K_RIGHT, pg.K_LSHIFT)
+    space = 1 << 5
+    version = 5  # ゲームの処理順を変えたら上げる（同じ入力でも結果が変わるため）
+
+    def __init__(self, seed: int, start_round: int = 0, bosshp: int = 100):
+        """
+        引数1 seed：ゲームの乱数のシード
+        引数2 start_round：開始ラウンド
+        引数3 bosshp：ボスのHP
+        """
+        self.seed = seed
+        self.start_round = start_round
+        self.bosshp = bosshp
+        self.frames = bytearray()
+        self.checksum = None  # 記録終了時のGame.checksum()
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def record(self, key_lst, events: list):
+        """
+        1フレーム分の入力を記録する
+        """
+        bits = 0
+        for i, key in enumerate(__class__.keys):
+            if key_lst[key]:
+                bits |= 1 << i
+        if any(event.type == pg.KEYDOWN and event.key == pg.K_SPACE for event in events):
+            bits |= __class__.space
+        self.frames.append(bits)
+
+    def get_pressed(self, tick: int) -> KeyState:
+        """
+        tickフレーム目に押されていたキーを返す
+        """
+        bits = self.frames[tick]
+        return KeyState(key for i, key in enumerate(__class__.keys) if bits & (1 << i))
+
+    def events(self, tick: int) -> list:
+        """
+        tickフレーム目に発生したイベントを返す
+        """
+        if self.frames[tick] & __class__.space:
+            return [pg.event.Event(pg.KEYDOWN, key=pg.K_SPACE)]
+        return []
+
+    def save(self, path: str, checksum: str):
+        """
+        記録をpathに保存する
+        引数1 path：保存先のパス
+        引数2 checksum：記録終了時のGame.checksum()
+        """
+        self.checksum = checksum
+        header = {"version": self.version, "seed": self.seed, "round": self.start_round, "bosshp": self.bosshp,
+                  "ticks": len(self.frames), "checksum": checksum}
+        with open(path, "wb") as f:
+            f.write(json.dumps(header).encode() + b"\n")
+            f.write(zlib.compress(bytes(self.frames), 9))
+
+    @classmethod
+    def load(cls, path: str) -> "InputRecording":
+        """
+        save()で保存した記録を読み込む
+        """
+        with open(path, "rb") as f:
+            header = json.loads(f.readline())
+            frames = zlib.decompress(f.read())
+        if header.get("version") != cls.version:
+            raise ValueError(f"{path}: 記録したときとゲームの処理順が違うので再生できない（version {header.get('version')}）")
+        if len(frames) != header["ticks"]:
+            raise ValueError(f"{path}: 入力の記録ファイルではないか，壊れている")
+        recording = cls(header["seed"], header["round"], header["bosshp"])
+        recording.frames = bytearray(frames)
+        recording.checksum = header["checksum"]
+        return recording
+
+
+class TickScheduler:
+    """
+    1フレームのロジックを段階ごと（入力→生成→更新→衝突）に登録した順で実行するクラス
+    描画はフレームレートに合わせて別に行う（Game.draw）
+    更新の段階には，スプライトのグループや飛行機をそれぞれ1回だけ登録し，1フレームに1回だけupdateを呼ぶ
+    check=Trueなら，更新の段階で各スプライトのupdateがちょうど1回ずつ呼ばれたかを確かめる（2重の更新を見つける）
+    """
+    phases = ("input", "spawn", "update", "collide")
+    check = False  # Trueのとき更新回数を数えて確かめる
+
+    def __init__(self, profiler: "FrameProfiler"):
+        self.profiler = profiler
+        self.handlers = {phase: [] for phase in __class__.phases}  # 段階 → [(名前, 関数, 更新するもの)]
+        self.counts = {}  # スプライト → このフレームでupdateが呼ばれた回数（check時）
+        self.expected = []  # このフレームで1回ずつ更新されるはずのスプライト（check時）
+
+    def add(self, phase: str, name: str, func, target=None):
+        """
+        段階phaseにfuncを登録する
+        引数1 phase：段階（phasesのどれか）
+        引数2 name：計測に使う名前
+        引数3 func：引数なしで呼ぶ関数．ゲームの終了理由を返したらそのフレームの処理をやめる
+        引数4 target：funcが更新するスプライトかグループ（check用）
+        """
+        if target is not None and any(entry[2] is target for entry in self.handlers[phase]):
+            raise ValueError(f"{name}: 同じものを2回登録している")
+        self.handlers[phase].append((name, func, target))
+
+    def add_update(self, name: str, target, *args):
+        """
+        target.update(*args)を更新の段階に登録する
+        """
+        self.add("update", f"update:{name}", lambda: target.update(*args), target)
+
+    def run(self) -> str | None:
+        """
+        1フレーム分の全段階を実行する
+        戻り値：ゲームが終わったら終了理由，続くならNone
+        """
+        lap = self.profiler.lap
+        for phase in __class__.phases:
+            checking = __class__.check and phase == "update"
+            if checking:
+                self.begin_check()
+            for name, func, _ in self.handlers[phase]:
+                result = func()
+                lap(name)
+                if result is not None:
+                    return result
+            if checking:
+                self.end_check()
+        return None
+
+    def watch(self, sprite: pg.sprite.Sprite):
+        """
+        spriteのupdateを呼ばれた回数を数えるものに差し替える
+        プールで前のゲームから再利用されたスプライトは，このschedulerで数えるように差し替え直す
+        """
+        wrapped = vars(sprite).get("update")
+        if wrapped is not None and wrapped.scheduler is self:
+            return
+        update = sprite.update if wrapped is None else wrapped.__wrapped__
+
+        def counted(*args, **kwargs):
+            self.counts[sprite] = self.counts.get(sprite, 0) + 1
+            return update(*args, **kwargs)
+        counted.__wrapped__ = update
+        counted.scheduler = self
+        sprite.update = counted
+
+    def begin_check(self):
+        self.counts = {}
+        self.expected = []
+        for _, _, target in self.handlers["update"]:
+            if target is None:
+                continue
+            if isinstance(target, pg.sprite.Sprite):
+                sprites, bulk = [target], False
+            else:
+                # updateを上書きしたグループ（EnemyGroupなど）はスプライトのupdateを呼ばずにまとめて動かすことがある
+                sprites, bulk = target.sprites(), type(target).update is not pg.sprite.Group.update
+            for sprite in sprites:
+                self.watch(sprite)
+                if not bulk:
+                    self.expected.append(sprite)
+
+    def end_check(self):
+        twice = sorted({type(sprite).__name__ for sprite, n in self.counts.items() if n > 1})
+        # 途中で消えたもの（BulletEngineが画面外で消した爆弾など）は更新されなくてよい
+        missed = sorted({type(sprite).__name__ for sprite in self.expected if sprite not in self.counts and sprite.alive()})
+        if twice or missed:
+            raise AssertionError(f"update count mismatch: updated more than once {twice}, not updated {missed}")
+
+
+class Game:
+    """
+    1ゲーム分の状態を保持し，1フレームずつ進めるクラス
+    """
+    def __init__(self, screen: pg.Surface, start_round: int = 0, bosshp: int = 100, bullet_engine: bool = False, dirty: bool = False, interpolate: bool = False, profiler: "FrameProfiler | None" = None, seed: int | None = None, record: bool = False):
+        """
+        引数1 screen：画面Surface
+        引数2 start_round：開始ラウンド（0～4）
+        引数3 bosshp：ボスのHP
+        引数4 bullet_engine：敵の弾をBulletEngine（要NumPy）でまとめて動かすか
+        引数5 dirty：変化した部分だけを画面に反映する差分描画モードにするか
+        引数6 interpolate：描画時に前フレームとの間の位置を補間するか
+        引数7 profiler：処理ごとの時間を計測するFrameProfiler（省略時は計測しない）
+        引数8 seed：このゲームの乱数のシード（省略時はランダムに決める）
+        引数9 record：フレームごとの入力をInputRecordingに記録するか
+        """
+        global gameround, rng
+        gameround = start_round
+        self.seed = random.randrange(2**32) if seed is None else seed
+        rng = self.rng = random.Random(self.seed)
+        self.recording = InputRecording(self.seed, start_round, bosshp) if record else None
+        self.screen = screen
+        self.dirty = DirtyScreen(screen) if dirty else None
+        self.interpolate = interpolate
+        self.prev_pos = {}  # 補間用の前フレームの位置
+        self.render_queue = RenderQueue()
+        self.result = None  # ゲームの終了理由
+        self.paused = False  # 一時停止中か（一時停止の表示を描く）
+        self.profiler = profiler or FrameProfiler()
+        self.bosshp = bosshp
+        self.score = Score()
+
+        self.bird = Bird(3, (WIDTH//2, HEIGHT-100))
+        self.bombs = pg.sprite.Group()
+        self.bombs2 = pg.sprite.Group()
+        self.beams = pg.sprite.Group()
+        self.exps = pg.sprite.Group()
+        self.emys = EnemyGroup()
+        self.shields = pg.sprite.Group()
+        self.gvys = pg.sprite.Group()
+
+        self.round_manager = Round(start_round)
+        self.spawn_rates = list(SPAWN_RATES)
+        self.score.value = self.round_manager.required_scores[start_round]
+        self.weapons = WeaponGroup()
+        self.items = pg.sprite.Group()
+        self.bosses = pg.sprite.Group()
+        self.life = Life(self.bird.hp)
+        self.hud = Hud(self.score, self.life)
+        for bullet in ShootingSatelliteWeapon.bullets.sprites():  # 前のゲームの衛星弾を持ち越さない
+            bullet.kill()
+
+        self.tmr = 0
+        self.num_barriers = 3
+        self.angle = 360 / self.num_barriers
+        self.weapon_cooldown = dict(WEAPON_COOLDOWNS)
+        self.weapon_kinds = list(self.weapon_cooldown)  # 同じフレームに期限が来たときの発射順
+        self.weapon_fire = {"bullet": self.fire_bullet, "satellite": self.fire_satellite,
+                            "slash": self.fire_slash, "boomerang": self.fire_boomerang, "homing": self.fire_homing}
+        self.weapon_timers = TimerWheel()  # アイテムが出ていないフレームだけ進める
+        for kind in self.weapon_cooldown:
+            self.weapon_timers.schedule(kind, 1)  # 最初のフレームで全種類を発射する
+        self.weapon_dict = {"weapon_mode":0, "satellite":0, "slash":0, "boomerang":0, "homing":0}
+        self.boss_count = 0
+        self.hit = SpatialHash()
+        self.targets = TargetIndex()  # ホーミング弾の狙い先を探すための敵機とボスの索引
+        if bullet_engine and np is None:
+            raise RuntimeError("BulletEngineにはNumPyが必要です")
+        self.bullet_engine = BulletEngine() if bullet_engine else None
+        self.key_lst, self.events = KeyState(()), []  # 処理中のフレームの入力
+        self.scheduler = self.schedule()
+
+    def flip(self):
+        """
+        描画した内容を画面に反映する
+        """
+        if self.dirty is not None:
+            self.dirty.flip()
+        else:
+            pg.display.update()
+        self.profiler.lap("display.update")
+
+    def fire_bullet(self) -> bool:
+        """
+        通常弾（貫通弾）を発射する
+        戻り値：発射間隔を空けるか（Falseなら次のフレームにもう一度呼ぶ）
+        """
+        mode = self.weapon_dict["weapon_mode"]
+        if mode == 2:
+            return False
+        if mode == 0:
+            self.weapons.add(NormalWeapon.spawn(self.bird, 10))
+            self.weapons.add(NormalWeapon.spawn(self.bird, -10))
+        elif mode == 1:
+            self.weapons.add(PenetWeapon.spawn(self.bird, 10))
+            self.weapons.add(PenetWeapon.spawn(self.bird, -10))
+        return True
+
+    def fire_satellite(self) -> bool:
+        """
+        衛星（レベル2は弾を撃つ衛星）が減っていたら全部作り直す
+        """
+        kind = {1: SatelliteWeapon, 2: ShootingSatelliteWeapon}.get(self.weapon_dict["satellite"])
+        if kind is not None and self.weapons.count(kind) < self.num_barriers:
+            self.weapons.remove(*self.weapons.of(kind))
+            for i in range(self.num_barriers):
+                self.weapons.add(kind(self.bird, 75, self.angle * i))
+        return True
+
+    def fire_slash(self) -> bool:
+        if self.weapon_dict["slash"] == 1:
+            self.weapons.add(SlashWeapon(self.bird))
+        return True
+
+    def fire_boomerang(self) -> bool:
+        if self.weapon_dict["boomerang"] == 1:
+            self.weapons.add(BoomerangWeapon(self.bird))
+        return True
+
+    def fire_homing(self) -> bool:
+        if self.weapon_dict["homing"] >= 1:
+            self.weapons.add(HomingWeapon(self.bird, 60), HomingWeapon(self.bird, 120))  # 左右斜め上に1羽ずつ
+        return True
+
+    def aim_homing(self):
+        """
+        ホーミング弾ごとに最も近い敵機かボスを選び直す（敵機とボスの索引は1フレームに1回だけ作る）
+        """
+        homing = self.weapons.of(HomingWeapon)
+        if not homing:
+            return
+        self.targets.build(self.emys, self.bosses)
+        targets = self.targets.nearest_many([weapon.rect.center for weapon in homing])
+        for weapon, target in zip(homing, targets):
+            weapon.target = target
+
+    def add_bomb(self, group: pg.sprite.AbstractGroup, bomb: "Bomb"):
+        """
+        爆弾をグループに加え，BulletEngineを使う場合は登録する
+        """
+        group.add(bomb)
+        if self.bullet_engine is not None:
+            self.bullet_engine.add(bomb)
+
+    def bird_hit(self, group: pg.sprite.AbstractGroup, nohit: bool) -> bool:
+        """
+        飛行機に当たった爆弾を消し，当たったかどうかを返す
+        引数1 group：判定する爆弾のグループ
+        引数2 nohit：groupが消せない爆弾（mode 2）のグループか
+        """
+        engine = self.bullet_engine
+        if engine is None:
+            return bool(self.hit.spritecollide(self.bird, group, True))
+        hits = engine.collide(self.bird.rect, nohit, self.bird)
+        engine.kill(hits)
+        return bool(hits)
+
+    def resolve_collisions(self):
+        """
+        武器と対象の組をそれぞれ1回だけ判定し，COLLISION_RULESに従って処理する
+        """
+        hit = self.hit
+        targets = {"emys": self.emys, "bombs": self.bombs, "bosses": self.bosses, "bombs2": self.bombs2}
+        hit.build(*targets.values())
+        sources = [
+            (self.weapons, None),
+            (ShootingSatelliteWeapon.bullets, None),
+            (self.shields, "shield"),
+            (self.gvys, "gravity"),
+        ]
+        for group, kind in sources:
+            for weapon in group.sprites():
+                weapon_kind = kind or type(weapon)
+                alive = True
+                for name, target_group in targets.items():
+                    rule = COLLISION_RULES.get((weapon_kind, name))
+                    if rule is None:
+                        continue
+                    kill_weapon, kill_target, points, effect = rule
+                    for target in hit.spritecollide(weapon, target_group, False):
+                        if kill_target:
+                            target.kill()
+                        self.score.value += points
+                        if effect is not None:
+                            self.apply_effect(effect, target)
+                        if kill_weapon:
+                            weapon.kill()
+                            alive = False
+                            break
+                    if not alive:
+                        break
+
+    def apply_effect(self, effect: tuple[str, int], target: pg.sprite.Sprite):
+        """
+        当たり判定の効果を適用する
+        引数1 effect：COLLISION_RULESの効果
+        引数2 target：武器が当たった対象
+        """
+        kind, n = effect
+        if kind == "explosion":
+            self.exps.add(Explosion.spawn(target, n))
+        elif kind == "chain":
+            self.gvys.add(Explosion.spawn(target, n))
+        elif kind == "damage":
+            target.hp -= n
+
+    def step(self, key_lst, events: list) -> str | None:
+        """
+        ゲームを1フレーム進めて描画する
+        引数1 key_lst：押下キーの真理値リスト
+        引数2 events：このフレームに発生したイベントのリスト
+        戻り値：ゲーム続行中はNone，終了時は"quit"，"gameover"，"clear"のいずれか
+        """
+        self.profiler.begin_frame()
+        result = self.update(key_lst, events)
+        self.draw()
+        self.profiler.end_frame(self.sprite_counts())
+        return result
+
+    def update(self, key_lst, events: list) -> str | None:
+        """
+        ゲームのロジックを1フレーム（1/TICK_RATE秒）分進める．描画は行わない
+        入力→生成→更新→衝突の順にschedulerに登録した処理を実行する
+        引数1 key_lst：押下キーの真理値リスト
+        引数2 events：このフレームに発生したイベントのリスト
+        戻り値：ゲーム続行中はNone，終了時は"quit"，"gameover"，"clear"のいずれか
+        """
+        if self.result is not None:  # 終了画面の表示中は何もしない
+            return self.result
+        if self.recording is not None:
+            self.recording.record(key_lst, events)
+        if self.interpolate:
+            self.prev_pos = {sprite: sprite.rect.topleft for group in self.draw_groups() for sprite in group}
+        self.key_lst, self.events = key_lst, events
+        self.result = self.scheduler.run()
+        if self.result is not None:
+            return self.result
+        self.tmr += 1
+        return None
+
+    def schedule(self) -> TickScheduler:
+        """
+        1フレームの処理を段階ごとに登録したTickSchedulerを作る
+        更新の段階には各グループ（と飛行機）を1回ずつ登録する
+        """
+        scheduler = TickScheduler(self.profiler)
+        scheduler.add("input", "events", self.handle_events)
+        scheduler.add("spawn", "fire", self.fire_weapons)
+        scheduler.add("spawn", "round.update", lambda: self.round_manager.update(self.score, self.items))
+        scheduler.add("spawn", "spawn", self.spawn)
+        scheduler.add("spawn", "aim", self.aim_homing)
+        scheduler.add_update("items", self.items)
+        scheduler.add_update("exps", self.exps)
+        scheduler.add("update", "update:bird", lambda: self.bird.update(self.key_lst), self.bird)
+        scheduler.add_update("weapons", self.weapons)
+        scheduler.add_update("bullets", ShootingSatelliteWeapon.bullets)
+        scheduler.add_update("emys", self.emys)
+        if self.bullet_engine is not None:
+            scheduler.add("update", "update:bullet_engine", self.bullet_engine.update)
+        scheduler.add_update("bombs", self.bombs)
+        scheduler.add_update("bombs2", self.bombs2)
+        scheduler.add_update("gvys", self.gvys)
+        scheduler.add_update("shields", self.shields)
+        scheduler.add_update("bosses", self.bosses, self.bosshp)
+        scheduler.add("collide", "collide", self.collide)
+        return scheduler
+
+    def handle_events(self) -> str | None:
+        """
+        このフレームのイベントを処理する
+        """
+        bird = self.bird
+        for event in self.events:
             if event.type == pg.QUIT:
-                return 0
+                return "quit"
             if event.type == pg.KEYDOWN and event.key == pg.K_SPACE:
-                beams.add(Beam(bird))
-
-            if not bird.is_invincible and pg.sprite.spritecollide(bird, bombs, True):
-                bird.hp -= 1
-                # bird.blink(screen)  # 飛行機が攻撃を受けたらフラッシュする
-                if bird.hp <= 0:
-                    score.update(screen)
-                    pg.display.update()
-                    time.sleep(2)
-                    return
-        """武器の発射処理"""
-        if len(items) == 0:
-            for i in weapon_cooldown:
-                weapon_timer[i] += 1
-            if weapon_timer["bullet"] >= weapon_cooldown["bullet"] and weapon_dict["weapon_mode"] != 2:
-                if weapon_dict["weapon_mode"] == 0:
-                    weapons.add(NormalWeapon(bird, 10))
-                    weapons.add(NormalWeapon(bird, -10))
-                elif weapon_dict["weapon_mode"] == 1:
-                    weapons.add(PenetWeapon(bird, 10))
-                    weapons.add(PenetWeapon(bird, -10))
-                weapon_timer["bullet"] = 0
-            # 弾丸
-            if weapon_timer["satellite"] >= weapon_cooldown["satellite"]:
-                if weapon_dict["satellite"] == 1:
-                    # SatelliteWeaponを削除
-                    current_satellite_count = sum(isinstance(weapon, SatelliteWeapon) for weapon in weapons)
-                    if current_satellite_count < num_barriers:
-                        for weapon in list(weapons):
-                            if isinstance(weapon, SatelliteWeapon):
-                                weapons.remove(weapon)
-                        for i in range(num_barriers):
-                            ten = angle * i
-                            weapons.add(SatelliteWeapon(bird, 75, ten))
-                elif weapon_dict["satellite"] == 2:
-                    # 既存のSatelliteWeaponの数をカウント
-                    current_satellite_count = sum(isinstance(weapon, ShootingSatelliteWeapon) for weapon in weapons)
-                    # 既存のSatelliteWeaponの数がバリア数より少なくなっていたら再生成
-                    if current_satellite_count < num_barriers:
-                        for weapon in list(weapons):
-                            if isinstance(weapon, ShootingSatelliteWeapon):
-                                weapons.remove(weapon)
-                        for i in range(num_barriers):
-                            ten = angle * i
-                            weapons.add(ShootingSatelliteWeapon(bird, 75, ten))
-                weapon_timer["satellite"] = 0
-            # 衛星弾
-            if weapon_timer["slash"] >= weapon_cooldown["slash"]:
-                if weapon_dict["slash"] == 1:
-                    weapons.add(SlashWeapon(bird))
-                weapon_timer["slash"] = 0
-            # 斬撃
-            if weapon_timer["boomerang"] >= weapon_cooldown["boomerang"]:
-                if weapon_dict["boomerang"] == 1:
-                    weapons.add(BoomerangWeapon(bird))
-                weapon_timer["boomerang"] = 0
-            # ブーメラン            
-        
+                self.beams.add(Beam(bird))
+            if event.type == pg.KEYDOWN and event.key == pg.K_F3:
+                self.profiler.toggle()  # 計測結果のオーバーレイ表示を切り替える
+        return None
 
-        screen.blit(bg_img, [0, 0])
+    def fire_weapons(self):
+        """
+        発射間隔の期限が来た種類の武器を発射する
+        """
+        if len(self.items) == 0:
+            timers = self.weapon_timers
+            for kind in sorted(timers.advance(), key=self.weapon_kinds.index):  # 期限が来た種類だけ発射する
+                fired = self.weapon_fire[kind]()
+                timers.schedule(kind, self.weapon_cooldown[kind] if fired else 1)
 
-        if round_manager.is_transitioning:
-            screen.fill((0, 0, 0))  # 黒い背景を描画
-        else:
-            screen.blit(bg_img, [0, 0])  # 通常の背景を描画
-        round_manager.update(screen, score, items)
-
-        if not round_manager.is_transitioning:
-            if len(items) == 0:
-                if gameround == 0:
-                    if tmr%250 == 0:  # 200フレーム，敵機を出現させる
-                        for _ in range(1):
-                            emys.add(Enemy())
-                elif gameround == 1:
-                    if tmr%200 == 0:  # 200フレーム，敵機を出現させる
-                        for _ in range(2):  # 敵機の数
-                            emys.add(Enemy())
-                elif gameround == 2:
-                    if tmr%170 == 0:  # 200フレーム，敵機を出現させる
-                        for _ in range(4):  # 敵機の数
-                            emys.add(Enemy())
-                elif gameround == 3:
-                    if tmr%80 == 0:  # 200フレーム，敵機を出現させる
-                        for _ in range(5):  # 敵機の数
-                            emys.add(Enemy())
-                elif gameround == 4:
-                    if boss_count == 0:
-                        bosses.add(Boss(bosshp))
-                        boss_count += 1
-                for emy in emys:
-                    if tmr%emy.interval == 0:
-                        # 敵機が停止状態に入ったら，intervalに応じて爆弾投下
-                        bombs.add(Bomb(emy, bird))
-
-                for boss in bosses:
-                    if tmr%boss.interval == 0:
-                    # intervalに応じて爆弾投下
-                        if boss.boss_mode == "yowayowa" or boss.boss_mode =="tuyotuyo":
-                            bombs.add(Bomb(boss, bird, 1))  # 自分に向けてボム投下
-                        else:
-                            bombs.add(Bomb(boss, bird, 3))  # ランダム5パターンのうち1つの方向にボムを投下
-                    if boss.boss_mode=="tuyotuyo" or boss.boss_mode == "tuyotuyotuyo":
-                        if tmr%boss.interval2 == 0:
-                            bombs2.add(Bomb(boss, bird, 2))  # 消えないボム投下
-
-            """武器の衝突処理"""
-            if weapon_dict["weapon_mode"] == 0:
-                """weaponmodeがnormal(ノーマル)のときの衝突処理"""
-                
-                for emy in pg.sprite.groupcollide(emys, weapons, True, True).keys():
-                            exps.add(Explosion(emy, 100))  # 爆発エフェクト
-                            score.value += 10  # 10点アップ
-                for bomb in pg.sprite.groupcollide(bombs, weapons, True, False).keys():
-                    exps.add(Explosion(bomb, 50))  # 爆発エフェクト
-                    score.value += 1  # 1点アップ
-                for boss in pg.sprite.groupcollide(bosses, weapons, False, True).keys():
-                    boss.hp -= 1  # ボスに攻撃が当たったらボスのHPを1減らす
-                for bomb in pg.sprite.groupcollide(bombs2, weapons, False, True).keys():  # 消せないボムとビームがぶつかったらビームのみを消す
-                    pass
-            
-            elif weapon_dict["weapon_mode"] == 1:
-                """weaponmodeがpanet(貫通モード)のときの衝突処理"""
-                for emy in pg.sprite.groupcollide(emys, weapons, True, False).keys():
-                    exps.add(Explosion(emy, 100))  # 爆発エフェクト
-                    score.value += 10  # 10点アップ
-                for bomb in pg.sprite.groupcollide(bombs, weapons, True, False).keys():
-                    exps.add(Explosion(bomb, 50))  # 爆発エフェクト
-                    score.value += 1  # 1点アップ
-                for boss in pg.sprite.groupcollide(bosses, weapons, False, True).keys():
-                    boss.hp -= 1  # ボスに攻撃が当たったらボスのHPを1減らす
-                for bomb in pg.sprite.groupcollide(bombs2, weapons, False, True).keys():  # 消せないボムとビームがぶつかったらビームのみを消す
-                    pass
-
-            if weapon_dict["satellite"] == 1:
-                for emy in pg.sprite.groupcollide(emys, weapons, True, False).keys():
-                    exps.add(Explosion(emy, 100))
-                    score.value += 10
-                for bomb in pg.sprite.groupcollide(bombs, weapons, True, False).keys():
-                    exps.add(Explosion(bomb, 50))
-                    score.value += 1
-                for boss in pg.sprite.groupcollide(bosses, weapons, False, False).keys():
-                    boss.hp -= 1  # ボスに攻撃が当たったらボスのHPを1減らす
-                for bomb in pg.sprite.groupcollide(bombs2, weapons, True, True).keys():  # 消せないボムとビームがぶつかったらビームのみを消す
-                    pass
-
-            elif weapon_dict["satellite"] == 2:
-                for emy in pg.sprite.groupcollide(emys, weapons, True, True).keys():
-                    exps.add(Explosion(emy, 100))
-                    score.value += 10
-                for bomb in pg.sprite.groupcollide(bombs, weapons, True, False).keys():
-                    exps.add(Explosion(bomb, 50))
-                    score.value += 1
-                for emy in pg.sprite.groupcollide(emys, ShootingSatelliteWeapon.bullets, True, True).keys():
-                    exps.add(Explosion(emy, 100))
-                    score.value += 10
-                for bomb in pg.sprite.groupcollide(bombs, ShootingSatelliteWeapon.bullets, True, True).keys():
-                    exps.add(Explosion(bomb, 50))
-                    score.value += 1
-                for boss in pg.sprite.groupcollide(bosses, weapons, False, False).keys():
-                    boss.hp -= 1  # ボスに攻撃が当たったらボスのHPを1減らす
-                for boss in pg.sprite.groupcollide(bosses, ShootingSatelliteWeapon.bullets, False, True).keys():
-                    boss.hp -= 1  # ボスに攻撃が当たったらボスのHPを1減らす
-                for bomb in pg.sprite.groupcollide(bombs2, weapons, False, True).keys():  # 消せないボムとビームがぶつかったらビームのみを消す
-                    pass
-                for bomb in pg.sprite.groupcollide(bombs2, ShootingSatelliteWeapon.bullets, False, True).keys():  # 消せないボムとビームがぶつかったらビームのみを消す
-                    pass
-
-            if weapon_dict["slash"] == 1:
-                for emy in pg.sprite.groupcollide(emys, weapons, True, False).keys():
-                    exps.add(Explosion(emy, 100))
-                    score.value += 10
-                for bomb in pg.sprite.groupcollide(bombs, weapons, True, False).keys():
-                    exps.add(Explosion(bomb, 50))
-                    score.value += 1
-                for boss in pg.sprite.groupcollide(bosses, weapons, False, False).keys():
-                    boss.hp -= 1  # ボスに攻撃が当たったらボスのHPを1減らす
-                # for bomb in pg.sprite.groupcollide(bombs2, weapons, False, False).keys():  # 消せないボムとビームがぶつかったらビームのみを消す
-                #     pass
-
-            if weapon_dict["boomerang"] == 1:
-                for emy in pg.sprite.groupcollide(emys, weapons, True, False).keys():
-                    exps.add(Explosion(emy, 100))
-                    score.value += 10
-                for bomb in pg.sprite.groupcollide(bombs, weapons, True, False).keys():
-                    exps.add(Explosion(bomb, 50))
-                    score.value += 1
-                for boss in pg.sprite.groupcollide(bosses, weapons, False, False).keys():
-                    boss.hp -= 1  # ボスに攻撃が当たったらボスのHPを1減らす
-                for bomb in pg.sprite.groupcollide(bombs2, weapons, False, True).keys():  # 消せないボムとビームがぶつかったらビームのみを消す
-                    pass
-                """追加武器の衝突処理終了"""
-                for bomb in pg.sprite.groupcollide(bombs, shields, True, True).keys():
-                    exps.add(Explosion(bomb, 50))
-
-                for emy in pg.sprite.groupcollide(emys, gvys, True, False).keys():
-                    gvys.add(Explosion(emy, 100))  # 爆発エフェクト
-                    score.value += 10
-
-                for bomb in pg.sprite.groupcollide(bombs, gvys, True, False).keys():
-                    gvys.add(Explosion(bomb, 50))
-                    score.value += 1
-
-            if (not bird.is_invincible and pg.sprite.spritecollide(bird, bombs, True)) or (not bird.is_invincible and pg.sprite.spritecollide(bird, bombs2, True)) or (not bird.is_invincible and pg.sprite.spritecollide(bird, bosses, False)):
-                bird.hp -= 1
-
-                if bird.hp <= 0:
-                    font = pg.font.Font(None, 50)
-                    img = font.render(f"GAME OVER", 0, (0, 0, 0))
-                    rect = img.get_rect()
-                    rect.center = WIDTH//2, HEIGHT//2
-                    screen.blit(img, rect)
-                    pg.display.update()
-                    time.sleep(2)
-                    return
-
-
-            if bosses.sprites() == [] and boss_count == 1:  # boss召喚後にbossが存在しない時
-                img2 = pg.transform.rotozoom(pg.image.load(f"fig/explosion.png"), 0, 5.0)
-                rect2 = img2.get_rect()
-                rect2.center = WIDTH//2, HEIGHT//2
-                screen.blit(img2, rect2)
-                font = pg.font.Font(None, 50)
-                color = (0, 0, 0)
-                img = font.render(f"GAME CLEAR", 0, color)
-                rect = img.get_rect()
-                rect.center = WIDTH//2, HEIGHT//2
-                screen.blit(img, rect)
-                
-                pg.display.update()
-                time.sleep(5)
+    def spawn(self):
+        """
+        敵機・ボス・爆弾を出現させる．ラウンドの切り替え中は敵機と爆弾を片付ける
+        """
+        bird, bombs, emys, bosses = self.bird, self.bombs, self.emys, self.bosses
+        tmr = self.tmr
+        if self.round_manager.is_transitioning:
+            emys.empty()
+            for bomb in bombs.sprites():
+                bomb.kill()
+            for exp in self.exps.sprites():
+                exp.kill()
+            return
+        if len(self.items) == 0:
+            if gameround < 4:
+                interval, count = self.spawn_rates[gameround]
+                if tmr%interval == 0:  # intervalフレームごとにcount体の敵機を出現させる
+                    for _ in range(count):
+                        emys.add(Enemy())
+            elif gameround == 4:
+                if self.boss_count == 0:
+                    bosses.add(Boss(self.bosshp))
+                    self.boss_count += 1
+            for emy in emys:
+                if tmr%emy.interval == 0:
+                    # 敵機が停止状態に入ったら，intervalに応じて爆弾投下
+                    self.add_bomb(bombs, Bomb.spawn(emy, bird))
+
+            for boss in bosses:
+                if tmr%boss.interval == 0:
+                # intervalに応じて爆弾投下
+                    if boss.boss_mode == "yowayowa" or boss.boss_mode =="tuyotuyo":
+                        self.add_bomb(bombs, Bomb.spawn(boss, bird, 1))  # 自分に向けてボム投下
+                    else:
+                        self.add_bomb(bombs, Bomb.spawn(boss, bird, 3))  # ランダム5パターンのうち1つの方向にボムを投下
+                if boss.boss_mode=="tuyotuyo" or boss.boss_mode == "tuyotuyotuyo":
+                    if tmr%boss.interval2 == 0:
+                        self.add_bomb(self.bombs2, Bomb.spawn(boss, bird, 2))  # 消えないボム投下
+
+    def collide(self) -> str | None:
+        """
+        更新後の位置で衝突を判定する（武器と敵，飛行機と爆弾・ボス，クリア判定，アイテムの取得）
+        """
+        if self.round_manager.is_transitioning:
+            return None
+        bird, bosses, items = self.bird, self.bosses, self.items
+        """武器の衝突処理"""
+        self.resolve_collisions()
+
+        if (not bird.is_invincible and self.bird_hit(self.bombs, False)) or (not bird.is_invincible and self.bird_hit(self.bombs2, True)) or (not bird.is_invincible and self.hit.spritecollide(bird, bosses, False)):
+            bird.hp -= 1
+
+            if bird.hp <= 0:
+                return "gameover"
+
+        if bosses.sprites() == [] and self.boss_count == 1:  # boss召喚後にbossが存在しない時
+            return "clear"
+        for item in pg.sprite.spritecollide(bird, items, True): #アイテムの取得処理
+            if item.item_name == "rate_up":
+                    self.weapon_cooldown["bullet"] = 7
+                    self.weapon_timers.schedule("bullet", 1)  # 次のフレームから新しい間隔で撃つ
+            else:
+                self.weapon_dict[item.item_name] += 1
+            items.empty()
+            for weapon in self.weapons.sprites():  # プールする弾はプールに戻す
+                weapon.kill()
+        return None
+
+    def checksum(self) -> str:
+        """
+        ゲームの状態（フレーム数・スコア・HP・全スプライトの位置・乱数の状態）のハッシュ値
+        同じシードと入力で実行すれば，描画や弾の処理方法によらず同じ値になる
+        """
+        state = [self.tmr, self.result, self.score.value, self.bird.hp, self.bird.rect.topleft,
+                 self.round_manager.current_round, [boss.hp for boss in self.bosses], self.rng.getstate()]
+        for group in self.draw_groups() + [self.items]:
+            state.append([(type(sprite).__name__, sprite.rect.topleft) for sprite in group])
+        return hashlib.sha1(repr(state).encode()).hexdigest()[:16]
+
+    def sprite_counts(self) -> dict[str, int]:
+        """
+        スプライトグループごとのスプライト数
+        """
+        return {
+            "emys": len(self.emys), "bombs": len(self.bombs), "bombs2": len(self.bombs2),
+            "bosses": len(self.bosses), "weapons": len(self.weapons),
+            "bullets": len(ShootingSatelliteWeapon.bullets), "exps": len(self.exps), "items": len(self.items),
+        }
+
+    def draw_groups(self) -> list[pg.sprite.AbstractGroup]:
+        """
+        描画するスプライトのグループ
+        """
+        return [self.exps, self.weapons, ShootingSatelliteWeapon.bullets, self.emys, self.bombs,
+                self.bombs2, self.gvys, self.shields, self.bosses]
+
+    def draw(self, alpha: float = 1.0):
+        """
+        現在の状態を描画する
+        引数 alpha：前フレームから今フレームまでのどこを描くか（補間しないときは1）
+        """
+        screen = self.screen
+        round_manager = self.round_manager
+        background = None if round_manager.is_transitioning else round_manager.background()
+        if self.dirty is None or self.dirty.begin(background):
+            if round_manager.is_transitioning:
+                screen.fill((0, 0, 0))  # 黒い背景を描画
+            round_manager.draw(screen)
+        if self.dirty is not None:
+            screen = self.dirty  # 以降の描画は差分として記録する
+        self.profiler.lap("draw:background")
+
+        queue = self.render_queue
+        prev = self.prev_pos if alpha < 1 else None
+        for item in self.items:
+            queue.add(item.text_area, item.text_rect, LAYERS["items"])
+            queue.add(item.small_image, item.rect, LAYERS["items"])
+        queue.add(self.bird.image, self.bird.rect, LAYERS["bird"])
+        queue.add_group(self.exps, LAYERS["exps"], prev, alpha)
+        queue.add_group(self.weapons, LAYERS["weapons"], prev, alpha)
+        queue.add_group(ShootingSatelliteWeapon.bullets, LAYERS["bullets"], prev, alpha)
+        queue.add_group(self.emys, LAYERS["emys"], prev, alpha)
+        queue.add_group(self.bombs, LAYERS["bombs"], prev, alpha)
+        queue.add_group(self.bombs2, LAYERS["bombs2"], prev, alpha)
+        if self.bullet_engine is not None:
+            queue.extend(self.bullet_engine.blit_sequence(), LAYERS["bullet_engine"])  # スプライトに対応しない弾
+        queue.add(*self.hud.render(self.bird.hp), LAYERS["hud"])
+        queue.add_group(self.gvys, LAYERS["gvys"], prev, alpha)
+        queue.add_group(self.shields, LAYERS["shields"], prev, alpha)
+        queue.add_group(self.bosses, LAYERS["bosses"], prev, alpha)
+
+        if self.result == "gameover":
+            font = text_cache.font(None, 50)
+            img = text_cache.render(font, f"GAME OVER", 0, (0, 0, 0))
+            queue.add(img, img.get_rect(center=(WIDTH//2, HEIGHT//2)), LAYERS["result"])
+        elif self.result == "clear":
+            img2 = transforms.rotozoom(assets.image(f"fig/explosion.png"), 0, 5.0)
+            queue.add(img2, img2.get_rect(center=(WIDTH//2, HEIGHT//2)), LAYERS["result"])
+            font = text_cache.font(None, 50)
+            img = text_cache.render(font, f"GAME CLEAR", 0, (0, 0, 0))
+            queue.add(img, img.get_rect(center=(WIDTH//2, HEIGHT//2)), LAYERS["result"])
+        elif self.paused:
+            font = text_cache.font(None, 50)
+            img = text_cache.render(font, f"PAUSE", 0, (255, 255, 255))
+            queue.add(img, img.get_rect(center=(WIDTH//2, HEIGHT//2)), LAYERS["result"])
+        self.profiler.lap("draw:queue")
+        queue.flush(screen)
+        self.profiler.lap("draw:blits")
+        self.profiler.draw_overlay(screen)
+        self.profiler.lap("draw:overlay")
+
+
+END_WAIT = {"gameover": 2, "clear": 5}  # 終了画面の表示秒数
+PAUSE_KEYS = (pg.K_p, pg.K_ESCAPE)  # 一時停止・再開のキー
+TICK_RATE = 50  # ゲームロジックを1秒間に進める回数
+
+
+def main(seed: int | None = None, start_round: int = 0, fps: int = 60, trace: str | None = None,
+         record: str | None = None, **game_options):
+    """
+    ウィンドウを開いて通常のゲームを実行する
+    ロジックは1/TICK_RATE秒ごとに固定で進め，描画はfpsを上限にできるだけ行う
+    引数1 seed：乱数のシード
+    引数2 start_round：開始ラウンド
+    引数3 fps：描画の上限フレームレート（0で上限なし）
+    引数4 trace：終了時にChromeトレース形式の計測結果を書き出すパス
+    引数5 record：フレームごとの入力を記録して保存するパス
+    引数6 game_options：Gameに渡す追加の引数
+    """
+    pg.display.set_caption("真！飛行機無双")
+    screen = pg.display.set_mode((WIDTH, HEIGHT))
+    assets.convert_all()
+    clock = pg.time.Clock()
+    round_assets.prefetch(start_round)  # タイトル画面の間に最初のラウンドの画像を読み込む
+
+    show_title_screen(screen)
+    startup.mark("first_frame")
+    title_start = time.perf_counter()
+    if idle(lambda: show_title_screen(screen), keys=(pg.K_s,)).type == pg.QUIT:
+        return 0
+    startup.wait(time.perf_counter() - title_start)  # Sキーを押すまでの時間は起動時間に含めない
+
+    game = Game(screen, start_round, profiler=FrameProfiler(trace is not None), seed=seed,
+                record=record is not None, **game_options)
+    try:
+        play(game, clock, fps)
+    finally:
+        if trace is not None:
+            game.profiler.export_chrome_trace(trace)
+        if record is not None:
+            game.recording.save(record, game.checksum())
+
+
+def play(game: Game, clock: pg.time.Clock, fps: int):
+    """
+    固定タイムステップでゲームを進め，終了したら戻る
+    """
+    tick = 1 / TICK_RATE
+    lag = 0.0  # まだロジックに反映していない経過時間
+    prev = time.perf_counter()
+    events = []
+    while True:
+        now = time.perf_counter()
+        lag += min(now - prev, 0.25)  # 長く止まった後に追いつこうとして固まらないようにする
+        prev = now
+        game.profiler.begin_frame()
+        events += pg.event.get()
+        game.profiler.lap("event.pump")
+        if any(event.type == pg.QUIT for event in events):
+            return
+        reason = pause_reason(events)
+        if reason is not None:
+            if not pause(game, reason):
                 return
-            for item in pg.sprite.spritecollide(bird, items, True): #アイテムの取得処理
-                if item.item_name == "rate_up":
-                        weapon_cooldown["bullet"] = 7
-                        weapon_timer["bullet"] = 7
-                else:
-                    weapon_dict[item.item_name] += 1
-                items.empty()
-                weapons.empty()
+            events = []
+            prev = time.perf_counter()  # 止まっていた時間は進めない
+            game.profiler.begin_frame()
+            continue
+        while lag >= tick:
+            game.update(pg.key.get_pressed(), events)
+            events = []
+            lag -= tick
+        game.draw(lag / tick if game.interpolate else 1.0)
+        game.flip()
+        startup.mark("first_interactive")
+        game.profiler.end_frame(game.sprite_counts())
+        if game.result is not None:  # 終了画面は変わらないので，閉じるまで眠って待つ
+            idle(lambda: (game.draw(), game.flip()), until=now + END_WAIT[game.result])
+            return
+        clock.tick(fps)
+
+
+def idle(redraw, keys=(), types=(), until: float | None = None) -> pg.event.Event | None:
+    """
+    画面が変わらない間（タイトル・一時停止・終了画面），イベントが来るまでpg.event.waitで眠って待つ
+    毎フレームイベントを見に行かないので，放置してもCPUを使わない
+    引数1 redraw：画面を描いて反映する関数（最初と，隠れていたウィンドウが見えたときに呼ぶ）
+    引数2 keys：待つのをやめるキー
+    引数3 types：待つのをやめるイベントの種類（QUITではいつもやめる）
+    引数4 until：この時刻（time.perf_counter()）になったらやめる（省略時は時間切れなし）
+    戻り値：待つのをやめたイベント（時間切れならNone）
+    """
+    redraw()
+    while True:
+        if until is None:
+            event = pg.event.wait()
         else:
-            emys.empty()
-            bombs.empty()
-            exps.empty()
-        items.update(screen)
-        exps.update()
-        exps.draw(screen)
-        bird.update(key_lst, screen)
-        # beams.update()
-        # beams.draw(screen)
-        weapons.update()
-        weapons.draw(screen)
-        weapons.update()
-        for weapon in weapons:
-            if isinstance(weapon, ShootingSatelliteWeapon):
-                weapon.bullets.draw(screen)
-        emys.update()
-        emys.draw(screen)
-        bombs.update()
-        bombs.draw(screen)
-        bombs2.update()
-        bombs2.draw(screen)
-        score.update(screen)
-        life.update(screen, bird.hp)
-        gvys.update()
-        gvys.draw(screen)
-        shields.draw(screen)
-        shields.update()
-        weapons.update()
-        bosses.draw(screen)
-        bosses.update(bosshp)
-        pg.display.update()
-        tmr += 1
-        clock.tick(50)
+            remaining = until - time.perf_counter()
+            if remaining <= 0:
+                return None
+            event = pg.event.wait(max(1, math.ceil(remaining * 1000)))
+        if event.type == pg.QUIT or event.type in types or (event.type == pg.KEYDOWN and event.key in keys):
+            return event
+        if event.type in (pg.WINDOWEXPOSED, pg.VIDEOEXPOSE):
+            redraw()
+
+
+def pause_reason(events: list) -> str | None:
+    """
+    このフレームのイベントから一時停止するかを決める
+    戻り値："key"（一時停止キー），"focus"（ウィンドウのフォーカスが外れたか最小化された），止めないならNone
+    """
+    reason = None
+    for event in events:
+        if event.type == pg.KEYDOWN and event.key in PAUSE_KEYS:
+            reason = "key"
+        elif event.type in (pg.WINDOWFOCUSLOST, pg.WINDOWMINIMIZED):
+            reason = reason or "focus"
+        elif event.type == pg.WINDOWFOCUSGAINED and reason == "focus":
+            reason = None  # すぐにフォーカスが戻った
+    return reason
+
+
+def pause(game: Game, reason: str) -> bool:
+    """
+    一時停止の画面を表示し，再開するまで眠って待つ
+    引数1 game：一時停止するゲーム
+    引数2 reason：pause_reasonの戻り値．"focus"ならフォーカスが戻ったときにも再開する
+    戻り値：再開したらTrue，ウィンドウを閉じたらFalse
+    """
+    game.paused = True
+    try:
+        event = idle(lambda: (game.draw(), game.flip()), keys=PAUSE_KEYS,
+                     types=(pg.WINDOWFOCUSGAINED,) if reason == "focus" else ())
+    finally:
+        game.paused = False
+    return event.type != pg.QUIT
+
+
+def run_headless(ticks: int, seed: int | None = None, start_round: int = 0, pilot=None,
+                 profile: bool = False, record: str | None = None, **game_options) -> dict:
+    """
+    画面を表示せず，フレーム上限もスリープもなしでゲームを回し続ける
+    ゲームが終了したら次のゲームを始め，合計ticksフレームに達するまで繰り返す
+    引数1 ticks：実行する合計フレーム数
+    引数2 seed：乱数のシード（ゲームごとに1ずつずらす）
+    引数3 start_round：開始ラウンド
+    引数4 pilot：get_pressed(tmr)を持つ入力源（省略時はアイドル）
+    引数5 profile：処理ごとの時間を計測するか（全ゲームで1つのFrameProfilerを使う）
+    引数6 record：最初のゲームの入力を記録して保存するパス
+    引数7 game_options：Gameに渡す追加の引数
+    戻り値：実行結果の辞書
+    """
+    screen = pg.display.set_mode((WIDTH, HEIGHT))
+    assets.convert_all()
+    pilot = pilot or ScriptedInput()
+    results = {"gameover": 0, "clear": 0, "quit": 0}
+    profiler = FrameProfiler(profile)
+    games = 0
+    total = 0
+    start = time.perf_counter()
+    while total < ticks:
+        game = Game(screen, start_round, profiler=profiler, seed=None if seed is None else seed + games,
+                    record=record is not None and games == 0, **game_options)
+        games += 1
+        result = None
+        while result is None and total < ticks:
+            result = game.step(pilot.get_pressed(game.tmr), [])
+            startup.mark("first_frame")
+            total += 1
+        if result is not None:
+            results[result] += 1
+        if game.recording is not None:
+            game.recording.save(record, game.checksum())
+    elapsed = time.perf_counter() - start
+    return {
+        "ticks": total,
+        "games": games,
+        "results": results,
+        "seconds": elapsed,
+        "ticks_per_sec": total / elapsed if elapsed > 0 else float("inf"),
+        "transforms": transforms.stats(),
+        "assets": assets.stats(),
+        "pools": {cls.__name__: pool.stats() for cls, pool in pools.items()},
+        "text": text_cache.stats(),
+        "masks": masks.stats(),
+        "round_assets": round_assets.stats(),
+        "asset_pack": asset_pack.stats(),
+        "profiler": profiler,
+    }
+
+
+def replay(path: str, **game_options) -> dict:
+    """
+    記録した入力で画面を描画せずにゲームを最高速度で再実行し，終了時のチェックサムを照合する
+    引数1 path：InputRecording.save()で保存したファイルのパス
+    引数2 game_options：Gameに渡す追加の引数（弾の処理方法などを変えても結果は同じになるはず）
+    戻り値：実行結果の辞書（"ok"がTrueなら記録時と同じ状態で終わった）
+    """
+    recording = InputRecording.load(path)
+    screen = pg.display.set_mode((WIDTH, HEIGHT))
+    assets.convert_all()
+    game = Game(screen, recording.start_round, recording.bosshp, seed=recording.seed, **game_options)
+    start = time.perf_counter()
+    for tick in range(len(recording)):
+        game.update(recording.get_pressed(tick), recording.events(tick))
+    elapsed = time.perf_counter() - start
+    checksum = game.checksum()
+    return {
+        "ticks": len(recording),
+        "result": game.result,
+        "checksum": checksum,
+        "expected": recording.checksum,
+        "ok": checksum == recording.checksum,
+        "seconds": elapsed,
+        "ticks_per_sec": len(recording) / elapsed if elapsed > 0 else float("inf"),
+    }
+
+
+def parse_args(argv: list[str] | None = None):
+    """
+    コマンドライン引数を解析する
+    """
+    import argparse
+    parser = argparse.ArgumentParser(description="鳥の悪魔討伐")
+    parser.add_argument("--headless", action="store_true", help="画面なし・フレーム上限なしで実行する")
+    parser.add_argument("--seed", type=int, default=None, help="乱数のシード")
+    parser.add_argument("--round", type=int, default=0, choices=range(5), help="開始ラウンド（0～4）")
+    parser.add_argument("--ticks", type=int, default=10000, help="ヘッドレス実行のフレーム数")
+    parser.add_argument("--input", default="idle", help="ヘッドレス実行の入力：idle，random，または入力スクリプトのパス")
+    parser.add_argument("--bullet-engine", action="store_true", help="敵の弾をNumPyでまとめて動かす")
+    parser.add_argument("--fps", type=int, default=60, help="描画の上限フレームレート（0で上限なし，ロジックは常に50回/秒）")
+    parser.add_argument("--interpolate", action="store_true", help="描画時にフレーム間の位置を補間する")
+    parser.add_argument("--dirty", action="store_true", help="変化した部分だけを画面に反映する")
+    parser.add_argument("--pool-cap", type=int, default=None, help="スプライトプールの上限（0でプールしない）")
+    parser.add_argument("--profile", action="store_true", help="処理ごとの平均時間を表示する（ヘッドレス実行）")
+    parser.add_argument("--trace", default=None, help="終了時に直近のフレームの計測結果をChromeトレース形式で書き出すパス")
+    parser.add_argument("--record", default=None, help="入力を記録して保存するパス（ヘッドレス実行では最初のゲーム）")
+    parser.add_argument("--replay", default=None, help="記録した入力を画面なし・最高速度で再実行し，終了時の状態を照合する")
+    parser.add_argument("--rect-collisions", action="store_true", help="見た目どおりの判定をせず，矩形だけで当たり判定する")
+    parser.add_argument("--check-collisions", action="store_true", help="ブロードフェーズの結果を総当たり判定と毎回照合する")
+    parser.add_argument("--check-updates", action="store_true", help="各スプライトが1フレームに1回だけ更新されたかを毎回確かめる")
+    parser.add_argument("--bake", action="store_true", help=f"変換済みの画像をまとめた{PACK_PATH}を作って終了する")
+    parser.add_argument("--no-pack", action="store_true", help=f"{PACK_PATH}を使わず，fig/の画像を読み込んで変換する")
+    parser.add_argument("--startup", action="store_true", help="終了時に起動にかかった時間（ミリ秒）を表示する")
+    return parser.parse_args(argv)
+
+
+startup.mark("import")
 
 
 if __name__ == "__main__":
+    args = parse_args()
+    SpatialHash.check = TargetIndex.check = args.check_collisions
+    TickScheduler.check = args.check_updates
+    SpatialHash.precise = not args.rect_collisions
+    if args.pool_cap is not None:
+        for pool in pools.values():
+            pool.cap = args.pool_cap
+    asset_pack.enabled = not args.no_pack
+    if args.headless or args.replay is not None or args.bake:
+        os.environ["SDL_VIDEODRIVER"] = "dummy"
+        os.environ["SDL_AUDIODRIVER"] = "dummy"
     pg.init()
-    main()
+    if args.bake:
+        pg.display.set_mode((WIDTH, HEIGHT))
+        stats = asset_pack.bake()
+        print(f"{PACK_PATH}: {stats['entries']} images, atlas {stats['atlas'][0]}x{stats['atlas'][1]}, {stats['bytes']} bytes")
+        if stats["skipped"]:
+            print(f"not packed (color key or no alpha): {', '.join(stats['skipped'])}")
+    elif args.replay is not None:
+        stats = replay(args.replay, bullet_engine=args.bullet_engine)
+        print(f"{stats['ticks']} ticks, {stats['result']}, {stats['seconds']:.2f}s, {stats['ticks_per_sec']:.0f} ticks/s")
+        print(f"checksum {stats['checksum']} (recorded {stats['expected']}): {'OK' if stats['ok'] else 'MISMATCH'}")
+        pg.quit()
+        sys.exit(0 if stats["ok"] else 1)
+    elif args.headless:
+        if args.input == "idle":
+            pilot = ScriptedInput()
+        elif args.input == "random":
+            pilot = RandomInput(args.seed)
+        else:
+            pilot = ScriptedInput.from_file(args.input)
+        stats = run_headless(args.ticks, args.seed, args.round, pilot, args.profile or args.trace is not None,
+                             args.record, bullet_engine=args.bullet_engine, dirty=args.dirty)
+        print(f"{stats['ticks']} ticks, {stats['games']} games {stats['results']}, "
+              f"{stats['seconds']:.2f}s, {stats['ticks_per_sec']:.0f} ticks/s")
+        print(f"transform cache: {stats['transforms']}")
+        print(f"assets: {stats['assets']}")
+        print(f"pools: {stats['pools']}")
+        print(f"text cache: {stats['text']}")
+        print(f"mask cache: {stats['masks']}")
+        print(f"round assets: {stats['round_assets']}")
+        print(f"asset pack: {stats['asset_pack']}")
+        if args.profile:
+            for name, ms in sorted(stats["profiler"].summary().items(), key=lambda item: -item[1]):
+                print(f"  {name}: {ms:.3f} ms")
+        if args.trace is not None:
+            stats["profiler"].export_chrome_trace(args.trace)
+    else:
+        main(args.seed, args.round, args.fps, args.trace, args.record, bullet_engine=args.bullet_engine, dirty=args.dirty, interpolate=args.interpolate)
+    if args.startup:
+        print(f"startup: {json.dumps(startup.report())}")
     pg.quit()
-    sys.exit()
\ No newline at end of file
+    sys.exit()
@@ -0,0 +1,180 @@
+"""
+真！飛行機無双（koukatongari.py）のバランス調整用パラメータスイープ
+ラウンドごとの必要スコア・敵機の出現間隔・爆弾の速度・ボスのHPの組み合わせごとに
+画面なしのゲームを何回も実行し，クリア率・クリアまでの時間・同時に出たスプライトの最大数を表にする
+ゲーム1回を1つの仕事としてProcessPoolExecutorに配るので，コア数に比例して速くなる
+
+    python sweep.py --games 50 --workers 8
+    python sweep.py --grid grid.json --pilot random --out sweep.json
+"""
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame as pg
+
+import koukatongari as kt
+
+
+# パラメータ名 → 試す値のリスト（--gridのJSONも同じ形式で，書かなかったパラメータは今の値のまま）
+DEFAULT_GRID = {
+    "required_scores": [[0, 50, 150, 300, 500], [0, 30, 100, 200, 350]],
+    "spawn_rates": [[list(rate) for rate in kt.SPAWN_RATES]],
+    "bomb_speeds": [list(kt.Bomb.speeds), [5, 7, 10, 14, 10]],
+    "bosshp": [50, 100],
+}
+MAX_TICKS = 30000  # 1ゲームの上限フレーム数（10分）
+BOMB_SPEEDS = list(kt.Bomb.speeds)  # 指定がないときの爆弾の速度（前の組み合わせの値を持ち越さない）
+
+screen = None  # ワーカープロセスごとの画面Surface
+
+
+def init_worker():
+    """
+    ワーカープロセスでpygameを初期化する
+    """
+    global screen
+    pg.init()
+    screen = pg.display.set_mode((kt.WIDTH, kt.HEIGHT))
+    kt.assets.convert_all()
+
+
+def make_pilot(pilot: str, seed: int):
+    if pilot == "idle":
+        return kt.ScriptedInput()
+    if pilot == "random":
+        return kt.RandomInput(seed)
+    return kt.ScriptedInput.from_file(pilot)
+
+
+def play(point: dict, seed: int, pilot: str, max_ticks: int) -> dict:
+    """
+    パラメータpointでゲームを1回，描画せずに最後まで実行する
+    戻り値：結果・フレーム数・到達ラウンド・グループごとのスプライト数の最大値
+    """
+    if screen is None:
+        init_worker()
+    kt.Bomb.speeds = list(point.get("bomb_speeds", BOMB_SPEEDS))
+    game = kt.Game(screen, 0, point.get("bosshp", 100), seed=seed)
+    if "required_scores" in point:
+        game.round_manager.required_scores = list(point["required_scores"])
+    if "spawn_rates" in point:
+        game.spawn_rates = [tuple(rate) for rate in point["spawn_rates"]]
+    inputs = make_pilot(pilot, seed)
+    peak = {}
+    peak_total = 0
+    result = None
+    while result is None and game.tmr < max_ticks:
+        result = game.update(inputs.get_pressed(game.tmr), [])
+        counts = game.sprite_counts()
+        for name, n in counts.items():
+            if n > peak.get(name, 0):
+                peak[name] = n
+        peak_total = max(peak_total, sum(counts.values()))
+    return {
+        "result": result or "timeout",
+        "ticks": game.tmr,
+        "round": game.round_manager.current_round,
+        "peak": peak,
+        "peak_total": peak_total,
+    }
+
+
+def expand(grid: dict) -> list[dict]:
+    """
+    パラメータごとの値のリストから全組み合わせを作る
+    """
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def summarize(point: dict, runs: list[dict]) -> dict:
+    """
+    1つのパラメータの組み合わせについて，全ゲームの結果をまとめる
+    """
+    clears = [run["ticks"] / kt.TICK_RATE for run in runs if run["result"] == "clear"]
+    peak = {}
+    for run in runs:
+        for name, n in run["peak"].items():
+            peak[name] = max(peak.get(name, 0), n)
+    return {
+        "point": point,
+        "games": len(runs),
+        "clear_rate": len(clears) / len(runs),
+        "clear_sec_mean": statistics.mean(clears) if clears else None,
+        "clear_sec_median": statistics.median(clears) if clears else None,
+        "survive_sec_mean": statistics.mean(run["ticks"] for run in runs) / kt.TICK_RATE,
+        "round_mean": statistics.mean(run["round"] for run in runs),
+        "timeouts": sum(run["result"] == "timeout" for run in runs),
+        "peak": peak,
+        "peak_total": max(run["peak_total"] for run in runs),
+    }
+
+
+def sweep(grid: dict, games: int, seed: int, pilot: str, workers: int | None, max_ticks: int = MAX_TICKS) -> list[dict]:
+    """
+    gridの全組み合わせについてgames回ずつゲームを実行し，組み合わせごとの集計を返す
+    シードは組み合わせによらずseed，seed+1，…を使うので，組み合わせ同士を同じ乱数で比べられる
+    """
+    points = expand(grid)
+    jobs = [(point, seed + i, pilot, max_ticks) for point in points for i in range(games)]
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(jobs) // (4 * workers))  # 仕事が偏らない程度にまとめて渡す
+    with ProcessPoolExecutor(workers, initializer=init_worker) as pool:
+        runs = list(pool.map(play, *zip(*jobs), chunksize=chunksize))
+    return [summarize(point, runs[i * games:(i + 1) * games]) for i, point in enumerate(points)]
+
+
+def print_table(rows: list[dict]):
+    """
+    集計結果を表にして表示する
+    """
+    names = list(rows[0]["point"]) if rows else []
+    print(" | ".join(names + ["clear", "clear_s", "survive_s", "round", "peak"]))
+    for row in rows:
+        values = [json.dumps(row["point"][name], separators=(",", ":")) for name in names]
+        clear_sec = "-" if row["clear_sec_mean"] is None else f"{row['clear_sec_mean']:.1f}"
+        values += [f"{row['clear_rate']:.0%}", clear_sec, f"{row['survive_sec_mean']:.1f}",
+                   f"{row['round_mean']:.2f}", str(row["peak_total"])]
+        print(" | ".join(values))
+
+
+def parse_args(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(description="koukatongari.pyのパラメータスイープ")
+    parser.add_argument("--grid", default=None, help="パラメータごとの値のリストを書いたJSON（省略時はDEFAULT_GRID）")
+    parser.add_argument("--games", type=int, default=20, help="組み合わせごとのゲーム数")
+    parser.add_argument("--seed", type=int, default=0, help="最初のゲームの乱数のシード")
+    parser.add_argument("--pilot", default="random", help="入力：idle，random，または入力スクリプトのパス")
+    parser.add_argument("--workers", type=int, default=None, help="プロセス数（省略時はCPU数）")
+    parser.add_argument("--max-ticks", type=int, default=MAX_TICKS, help="1ゲームの上限フレーム数")
+    parser.add_argument("--out", default=None, help="集計結果を保存するJSONのパス")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    grid = DEFAULT_GRID
+    if args.grid is not None:
+        with open(args.grid, encoding="utf-8") as f:
+            grid = json.load(f)
+    start = time.perf_counter()
+    rows = sweep(grid, args.games, args.seed, args.pilot, args.workers, args.max_ticks)
+    elapsed = time.perf_counter() - start
+    print_table(rows)
+    print(f"{len(rows)} points x {args.games} games in {elapsed:.1f}s")
+    if args.out is not None:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
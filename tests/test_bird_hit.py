@@ -0,0 +1,70 @@
+"""
+飛行機と爆弾の当たり判定が，イベントの数によらず1フレームに1回だけ，
+SpatialHash.preciseに従った判定（Game.bird_hit）で行われるかを確かめる
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame as pg
+import pytest
+
+import koukatongari as kt
+
+
+EVENTS = [pg.event.Event(pg.MOUSEMOTION, pos=(0, 0), rel=(1, 0), buttons=(0, 0, 0))] * 5
+
+
+@pytest.fixture(scope="module", autouse=True)
+def screen():
+    pg.init()
+    screen = pg.display.set_mode((kt.WIDTH, kt.HEIGHT))
+    kt.assets.convert_all()
+    return screen
+
+
+def corner_bomb(game: kt.Game) -> kt.Bomb:
+    """
+    矩形は飛行機と重なるが，見た目（マスク）は重ならない位置に置いた爆弾を返す
+    """
+    bird = game.bird
+    bomb = kt.Bomb.spawn(kt.Enemy(), bird)
+    for d in range(1, min(bird.rect.w, bomb.rect.w)):
+        bomb.rect.bottomright = bird.rect.left + d, bird.rect.top + d
+        if not kt.masks.collide(bird, bomb):
+            return bomb
+    pytest.skip("矩形だけが重なる位置がない")
+
+
+def ready(screen: pg.Surface) -> kt.Game:
+    """
+    ラウンドの切り替えが終わり，爆弾も無敵時間もない状態のゲームを返す
+    """
+    game = kt.Game(screen, 1, seed=1)
+    pilot = kt.RandomInput(1)
+    while game.round_manager.is_transitioning or game.tmr < 10:
+        game.update(pilot.get_pressed(game.tmr), [])
+    for bomb in game.bombs.sprites():
+        bomb.kill()
+    game.bird.is_invincible = False
+    return game
+
+
+@pytest.mark.parametrize("precise", [True, False], ids=["precise", "rect"])
+def test_bird_hit_once_per_tick(screen, monkeypatch, precise):
+    """
+    preciseなら矩形だけ重なる爆弾には当たらず，rectなら当たる．どちらもイベントがいくつあってもHPは1しか減らない
+    """
+    monkeypatch.setattr(kt.SpatialHash, "precise", precise)
+    game = ready(screen)
+    hp = game.bird.hp
+    game.bombs.add(corner_bomb(game), corner_bomb(game))
+    game.events = EVENTS
+    assert game.handle_events() is None
+    game.collide()
+    assert game.bird.hp == (hp if precise else hp - 1)
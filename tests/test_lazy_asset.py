@@ -0,0 +1,86 @@
+"""
+LazyAssetの指紋（AssetPackの画像を使ってよいかの判定）が，depsに書いたLazyAssetの変更で変わるかと，
+makeが読むLazyAssetがすべてdepsに書いてあるかを確かめる
+
+    python -m pytest tests
+"""
+import inspect
+import os
+import re
+import sys
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import koukatongari as kt
+
+
+def lazy_assets() -> list:
+    """
+    koukatongariのクラスに定義したLazyAssetの(クラス, 属性名, LazyAsset)
+    """
+    return [(cls, name, attr) for cls in vars(kt).values() if isinstance(cls, type)
+            for name, attr in list(vars(cls).items()) if isinstance(attr, kt.LazyAsset)]
+
+
+def is_lazy(cls: type, name: str) -> bool:
+    for base in cls.__mro__:
+        if name in vars(base):
+            return isinstance(vars(base)[name], kt.LazyAsset) or f"{base.__name__}.{name}" in kt.LazyAsset.fingerprints
+    return False
+
+
+@pytest.mark.parametrize("cls, name, attr", [pytest.param(*entry, id=f"{entry[0].__name__}.{entry[1]}") for entry in lazy_assets()])
+def test_deps_cover_reads(cls, name, attr):
+    """
+    makeの中でcls.属性やクラス名.属性として読むLazyAssetは，すべてdepsに書いてある
+    """
+    source = inspect.getsource(attr.make).split("#")[0]
+    reads = {f"{other}.{field}" if other != "cls" else field
+             for other, field in re.findall(r"\b(cls|[A-Z]\w*)\.(\w+)", source)
+             if is_lazy(cls if other == "cls" else getattr(kt, other, object), field)}
+    assert reads - {name} <= set(attr.deps)
+
+
+def sprite_class(second: bool) -> type:
+    """
+    同じ名前で，imgの作り方だけが違うクラス
+    """
+    if second:
+        class Sprite:
+            img = kt.LazyAsset(lambda cls: "b.png")
+            image = kt.LazyAsset(lambda cls: cls.img * 2, deps=("img",))
+    else:
+        class Sprite:
+            img = kt.LazyAsset(lambda cls: "a.png")
+            image = kt.LazyAsset(lambda cls: cls.img * 2, deps=("img",))
+    return Sprite
+
+
+@pytest.mark.parametrize("touched", [False, True], ids=["lazy", "replaced"])
+def test_fingerprint_follows_deps(monkeypatch, touched):
+    """
+    depsのLazyAssetの作り方が変わると指紋が変わる（先に参照されて値に置き換わった後でも同じ）
+    """
+    digests = []
+    for second in (False, True):
+        monkeypatch.setattr(kt.LazyAsset, "fingerprints", {})
+        cls = sprite_class(second)
+        if touched:
+            assert cls.img == ("b.png" if second else "a.png")
+        digests.append(vars(cls)["image"].digest())
+    assert digests[0] != digests[1]
+
+
+def test_undeclared_dep():
+    """
+    depsにLazyAssetでないものを書いたら指紋を作るときにエラーにする
+    """
+    class Sprite:
+        img = "a.png"
+        image = kt.LazyAsset(lambda cls: cls.img * 2, deps=("img",))
+    with pytest.raises(ValueError):
+        vars(Sprite)["image"].digest()
@@ -0,0 +1,49 @@
+"""
+InputRecordingで記録した入力を再生すると，記録したときと同じ状態（Game.checksum）で終わるかを確かめる
+記録するのは押されているキーとスペースキーだけなので，マウスやキーを離したイベントがあっても結果が変わらないこと
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame as pg
+import pytest
+
+import koukatongari as kt
+
+
+TICKS = 3000  # ゲームオーバーまで（爆弾に何度も当たるところまで）進める
+NOISE = [pg.event.Event(pg.MOUSEMOTION, pos=(0, 0), rel=(1, 0), buttons=(0, 0, 0)),
+         pg.event.Event(pg.KEYUP, key=pg.K_LEFT)]  # 記録されない（ゲームの進行に関係しない）イベント
+
+
+@pytest.fixture(scope="module", autouse=True)
+def screen():
+    pg.init()
+    screen = pg.display.set_mode((kt.WIDTH, kt.HEIGHT))
+    kt.assets.convert_all()
+    return screen
+
+
+@pytest.mark.parametrize("seed", range(1, 11))
+def test_replay_matches_recording(screen, tmp_path, seed):
+    """
+    毎フレーム記録されないイベントを混ぜて遊んだ記録を再生しても，チェックサムが一致する
+    """
+    game = kt.Game(screen, 1, seed=seed, record=True)
+    pilot = kt.RandomInput(seed)
+    for tick in range(TICKS):
+        events = NOISE[:tick % 3]
+        if tick % 40 == 0:
+            events = events + [pg.event.Event(pg.KEYDOWN, key=pg.K_SPACE)]
+        if game.update(pilot.get_pressed(tick), events) is not None:
+            break
+    path = tmp_path / "input.rec"
+    game.recording.save(str(path), game.checksum())
+    result = kt.replay(str(path))
+    assert result["ok"], result
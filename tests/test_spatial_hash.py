@@ -0,0 +1,132 @@
+"""
+SpatialHashの当たり判定がpygameの総当たり判定（pg.sprite.spritecollide，pg.sprite.groupcollide）と
+同じ結果を返すかを，シード付きで進めたゲームの状態で確かめる
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame as pg
+import pytest
+
+import koukatongari as kt
+
+
+ALL_WEAPONS = {"weapon_mode": 1, "satellite": 2, "slash": 1, "boomerang": 1, "homing": 1}
+STATES = [(1, 1), (3, 2), (3, 5), (4, 3)]  # (開始ラウンド, シード)
+CHECKPOINTS = range(100, 700, 150)  # 判定を照合するフレーム
+CROWD = 200  # 混雑した状態に足す爆弾の数
+
+
+@pytest.fixture(scope="module", autouse=True)
+def screen():
+    pg.init()
+    screen = pg.display.set_mode((kt.WIDTH, kt.HEIGHT))
+    kt.assets.convert_all()
+    return screen
+
+
+def play(screen: pg.Surface, start_round: int, seed: int, ticks: int, crowd: bool = False) -> kt.Game:
+    """
+    全武器を持った飛行機でticksフレーム進めたゲームを返す（飛行機は倒れない）
+    crowdなら最後に爆弾をCROWD個，ゲームの乱数で画面内に足す
+    """
+    game = kt.Game(screen, start_round, bosshp=10**6, seed=seed)
+    game.weapon_dict.update(ALL_WEAPONS)
+    pilot = kt.RandomInput(seed)
+    while game.tmr < ticks:
+        game.bird.hp = 10**9
+        if game.update(pilot.get_pressed(game.tmr), []) is not None:
+            break
+    if crowd:
+        emy = kt.Enemy()
+        for _ in range(CROWD):
+            bomb = kt.Bomb.spawn(emy, game.bird)
+            bomb.rect.center = game.rng.randrange(kt.WIDTH), game.rng.randrange(kt.HEIGHT)
+            game.bombs.add(bomb)
+    return game
+
+
+def targets(game: kt.Game) -> dict:
+    return {"emys": game.emys, "bombs": game.bombs, "bosses": game.bosses, "bombs2": game.bombs2}
+
+
+def sources(game: kt.Game) -> list:
+    return [game.weapons, kt.ShootingSatelliteWeapon.bullets, game.shields, game.gvys]
+
+
+def snapshot(game: kt.Game) -> list:
+    return [[(type(sprite).__name__, sprite.rect.topleft) for sprite in group]
+            for group in sources(game) + list(targets(game).values())]
+
+
+@pytest.mark.parametrize("min_sprites", [kt.SpatialHash.min_sprites, 0], ids=["default", "grid"])
+@pytest.mark.parametrize("precise", [True, False], ids=["precise", "rect"])
+@pytest.mark.parametrize("crowd", [False, True], ids=["game", "crowded"])
+def test_matches_pygame(screen, monkeypatch, min_sprites, precise, crowd):
+    """
+    どの武器・対象の組でもspritecollideとgroupcollideの結果（順番も含む）がpygameと一致する
+    """
+    monkeypatch.setattr(kt.SpatialHash, "min_sprites", min_sprites)
+    monkeypatch.setattr(kt.SpatialHash, "precise", precise)
+    collided = kt.SpatialHash.collided()
+    compared = 0
+    for start_round, seed in STATES:
+        for ticks in CHECKPOINTS:
+            game = play(screen, start_round, seed, ticks, crowd)
+            groups = targets(game)
+            game.hit.build(*groups.values())
+            for source in sources(game):
+                for group in groups.values():
+                    for sprite in source:
+                        expected = pg.sprite.spritecollide(sprite, group, False, collided)
+                        assert game.hit.spritecollide(sprite, group, False) == expected
+                        compared += len(expected)
+                    expected = pg.sprite.groupcollide(source, group, False, False, collided)
+                    assert game.hit.groupcollide(source, group, False, False) == expected
+    assert compared > 0  # 当たりのない状態だけを比べていない
+
+
+@pytest.mark.parametrize("min_sprites", [kt.SpatialHash.min_sprites, 0], ids=["default", "grid"])
+def test_groupcollide_kill_matches_pygame(screen, monkeypatch, min_sprites):
+    """
+    dokilla・dokillbで消したときも，消えるスプライトと戻り値がpygameと一致する
+    """
+    monkeypatch.setattr(kt.SpatialHash, "min_sprites", min_sprites)
+    collided = kt.SpatialHash.collided()
+    for start_round, seed in STATES:
+        game = play(screen, start_round, seed, 400, crowd=True)
+        game.hit.build(*targets(game).values())
+        got = game.hit.groupcollide(game.weapons, game.bombs, True, True)
+        got = [(a.rect.topleft, [b.rect.topleft for b in hits]) for a, hits in got.items()]
+        got_state = snapshot(game)
+
+        game = play(screen, start_round, seed, 400, crowd=True)
+        expected = pg.sprite.groupcollide(game.weapons, game.bombs, True, True, collided)
+        expected = [(a.rect.topleft, [b.rect.topleft for b in hits]) for a, hits in expected.items()]
+        assert got == expected
+        assert got_state == snapshot(game)
+
+
+@pytest.mark.parametrize("min_sprites", [kt.SpatialHash.min_sprites, 0], ids=["default", "grid"])
+def test_killed_after_build(screen, monkeypatch, min_sprites):
+    """
+    build()の後に消えたスプライト（resolve_collisionsで先に当たった敵や爆弾）は当たらない
+    """
+    monkeypatch.setattr(kt.SpatialHash, "min_sprites", min_sprites)
+    collided = kt.SpatialHash.collided()
+    for start_round, seed in STATES:
+        game = play(screen, start_round, seed, 400, crowd=True)
+        groups = targets(game)
+        game.hit.build(*groups.values())
+        for group in groups.values():
+            for sprite in group.sprites()[::2]:
+                sprite.kill()
+        for sprite in game.weapons:
+            for group in groups.values():
+                assert game.hit.spritecollide(sprite, group, False) == pg.sprite.spritecollide(sprite, group, False, collided)
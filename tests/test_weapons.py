@@ -0,0 +1,53 @@
+"""
+武器を1フレームに1回だけ動かすようにしても，武器の効き方（当たり判定を受けるフレーム数など）が
+以前（1フレームに3回動かしていたとき）と変わらないかを確かめる
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame as pg
+import pytest
+
+import koukatongari as kt
+
+
+SLASH_TICKS = 4  # 斬撃が当たり判定を受けるフレーム数（1フレームに3回動かしていたときのhp 10と同じ）
+
+
+@pytest.fixture(scope="module", autouse=True)
+def screen():
+    pg.init()
+    screen = pg.display.set_mode((kt.WIDTH, kt.HEIGHT))
+    kt.assets.convert_all()
+    return screen
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_slash_lifetime(screen, seed):
+    """
+    斬撃は出てからSLASH_TICKSフレームの間だけ，衝突の段階でweaponsにいる
+    """
+    game = kt.Game(screen, 1, seed=seed)
+    game.weapon_dict["slash"] = 1
+    seen = {}  # 斬撃 → 衝突の段階でweaponsにいたフレーム
+    resolve = game.resolve_collisions
+
+    def resolve_collisions():
+        for weapon in game.weapons.of(kt.SlashWeapon):
+            seen.setdefault(weapon, []).append(game.tmr)
+        resolve()
+    game.resolve_collisions = resolve_collisions
+    pilot = kt.RandomInput(seed)
+    for tick in range(400):
+        game.bird.hp = 10**9
+        game.update(pilot.get_pressed(tick), [])
+    lifetimes = [ticks for slash, ticks in seen.items() if not slash.alive()]
+    assert lifetimes
+    for ticks in lifetimes:
+        assert ticks == list(range(ticks[0], ticks[0] + SLASH_TICKS))